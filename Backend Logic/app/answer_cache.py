@@ -0,0 +1,112 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Thread-safe cache of chat answers looked up by question embedding similarity.
+
+    Entries are partitioned by (educational_stage, historical_era, topic), each
+    partition keeps the normalized question embeddings as one matrix, so a
+    lookup is a single matrix-vector product over that partition. A cached
+    answer is returned when the closest question's cosine similarity reaches
+    the threshold and the entry is younger than ttl seconds. Eviction is LRU
+    across all partitions.
+    """
+
+    def __init__(self, max_size: int, ttl: float, threshold: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()  # entry id -> (partition key, created, answer)
+        self._partitions = {}  # partition key -> (entry ids, embedding matrix)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    @staticmethod
+    def partition_key(educational_stage=None, historical_era=None, topic=None) -> Tuple:
+        if not historical_era or historical_era == 'None':
+            historical_era = None
+        return educational_stage, historical_era, topic
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype='float32').reshape(-1)
+        return embedding / np.linalg.norm(embedding)
+
+    def _remove(self, entry_id):
+        key, _, _ = self._entries.pop(entry_id)
+        ids, vectors = self._partitions[key]
+        position = ids.index(entry_id)
+        del ids[position]
+        if ids:
+            self._partitions[key] = (ids, np.delete(vectors, position, axis=0))
+        else:
+            del self._partitions[key]
+
+    def get(self, embedding, educational_stage=None, historical_era=None, topic=None) -> Optional[str]:
+        key = self.partition_key(educational_stage, historical_era, topic)
+        query = self._normalize(embedding)
+        with self._lock:
+            partition = self._partitions.get(key)
+            if partition is None:
+                self.misses += 1
+                return None
+
+            ids, vectors = partition
+            best = int(np.argmax(vectors @ query))
+            if float(vectors[best] @ query) < self.threshold:
+                self.misses += 1
+                return None
+
+            entry_id = ids[best]
+            _, created, answer = self._entries[entry_id]
+            if time.time() - created > self.ttl:
+                self._remove(entry_id)
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return answer
+
+    def put(self, embedding, answer: str, educational_stage=None, historical_era=None, topic=None):
+        key = self.partition_key(educational_stage, historical_era, topic)
+        vector = self._normalize(embedding)[None, :]
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (key, time.time(), answer)
+            if key in self._partitions:
+                ids, vectors = self._partitions[key]
+                self._partitions[key] = (ids + [entry_id], np.vstack([vectors, vector]))
+            else:
+                self._partitions[key] = ([entry_id], vector)
+
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evicted += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "partitions": len(self._partitions),
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "hit_rate": self.hits / lookups if lookups else 0,
+            }
@@ -0,0 +1,67 @@
+import sqlite3
+import threading
+from typing import Dict, Iterable
+
+import numpy as np
+
+from .config import Config
+from .question_set import question_hash
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answered_embeddings (
+    email TEXT NOT NULL,
+    educational_stage TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    question_hash BLOB NOT NULL,
+    embedding BLOB NOT NULL,
+    PRIMARY KEY (email, educational_stage, level, question_hash)
+) WITHOUT ROWID;
+"""
+
+
+class AnsweredEmbeddings:
+    """Embeddings of the questions each user answered, per stage and level.
+
+    Kept out of the progress file so the progress document, its journal and
+    its snapshots only hold question text. Rows live in a SQLite file (WAL)
+    shared by every worker process, keyed by the question_hash of the
+    question, with the embedding stored as float16.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or Config.ANSWERED_EMBEDDINGS_FILE
+        self._local = threading.local()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def put(self, email: str, educational_stage: str, level, questions: Iterable[str], embeddings,
+            replace: bool = True):
+        """Store the embedding of each question, keeping the ones already stored unless replace."""
+        rows = [
+            (email, educational_stage, int(level), question_hash(question),
+             np.asarray(embedding, dtype='float16').tobytes())
+            for question, embedding in zip(questions, embeddings)
+        ]
+        if not rows:
+            return
+        db = self._connect()
+        with db:
+            db.executemany(
+                f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO answered_embeddings "
+                "(email, educational_stage, level, question_hash, embedding) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def get(self, email: str, educational_stage: str, level) -> Dict[bytes, np.ndarray]:
+        """Every stored embedding of the level as float32 vectors, keyed by question_hash."""
+        rows = self._connect().execute(
+            "SELECT question_hash, embedding FROM answered_embeddings "
+            "WHERE email = ? AND educational_stage = ? AND level = ?",
+            (email, educational_stage, int(level)))
+        return {key: np.frombuffer(embedding, dtype='float16').astype('float32') for key, embedding in rows}
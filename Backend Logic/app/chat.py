@@ -13,6 +13,10 @@ from groq import Groq
 from typing import Dict, List
 import os
 
+from .config import Config
+from .embedding_codec import decode_embedding
+from .lexical_index import reciprocal_rank_fusion
+
 os.environ["GROQ_API_KEY"] = "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"
 
 DEFAULT_MODEL = "gemma2-9b-it"
@@ -35,6 +39,26 @@ def chat_completion(
     return response.choices[0].message.content
 
 
+def chat_completion_stream(
+    messages: List[Dict],
+    model=DEFAULT_MODEL,
+    temperature: float = 0.5,
+    top_p: float = 0.9,
+):
+    """Yield the answer's text deltas as Groq streams them."""
+    stream = client.chat.completions.create(
+        messages=messages,
+        model=model,
+        temperature=temperature,
+        top_p=top_p,
+        stream=True,
+    )
+    for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            yield delta
+
+
 def clean_arabic_content(text):
     # Remove English letters
     # text = re.sub(r'[a-zA-Z]+', '', text)
@@ -71,104 +95,136 @@ def combine_embeddings(question_embedding, history_embeddings, current_weight=0.
     combined = combined / np.linalg.norm(combined)
     return combined
 
-def relevantContent(question, model, data, history=None, educationalStage=None, historicalEra=None, max_words=1000, similarity_threshold=55):
+def relevantContent(question, ml_manager, passages, index, history=None, educationalStage=None, historicalEra=None, max_words=None, similarity_threshold=55, lexical_index=None, retrieval_mode=None, compressor=None):
     """
     Get relevant content based on the user's query and conversation history.
     
     Parameters:
     - question: The user's question (string)
-    - model: The sentence transformer model used for embedding
-    - data: DataFrame containing content, topics, and embeddings
+    - ml_manager: MLManager whose cached encoder embeds the question and history
+    - passages: DataFrame of corpus passages with Content and precomputed WordCount
+    - index: Prebuilt VectorIndex over passages, partitioned by stage and era
     - history: List of previous Q&A pairs
     - educationalStage: Optional, the educational stage to filter by
     - historicalEra: Optional, the historical era to filter by
-    - max_words: Maximum number of words to collect (default: 1000)
+    - max_words: Maximum number of words to collect (default: Config.CHAT_CONTEXT_MAX_WORDS)
     - similarity_threshold: Minimum similarity score to consider content relevant (default: 55)
+    - lexical_index: Optional BM25 LexicalIndex over the same passages
+    - retrieval_mode: 'dense', 'lexical' or 'hybrid' (default: Config.CHAT_RETRIEVAL_MODE)
+    - compressor: Optional ContextCompressor, keeps only the sentences closest to the question
     """
-    # Initial filtering
-    data = data.dropna(subset=['Content'])
-    filtered_data = data[data['Content'].notnull()]
-    if educationalStage:
-        filtered_data = filtered_data[filtered_data['EducationalStage'] == educationalStage]
-    if historicalEra and not filtered_data.empty and historicalEra != 'None':
-        filtered_data = filtered_data[filtered_data['HistoricalEra'] == historicalEra]
-
-    if filtered_data.empty:
+    # Skip the encoding entirely when the partition is empty
+    if index.get_selector(educationalStage, historicalEra) is None:
         return []
 
-    # use the Arabic stemmer to stem the question
-    ArListem = ArabicLightStemmer()
-    question = ' '.join(ArListem.light_stem(x) for x in question.split())
+    retrieval_mode = retrieval_mode or Config.CHAT_RETRIEVAL_MODE
+    if lexical_index is None:
+        retrieval_mode = 'dense'
 
-    # Get embeddings for current question and history
-    question_embedding = model.encode([question])
+    lexical_hits = []
+    if retrieval_mode in ('lexical', 'hybrid'):
+        # Weak keyword matches are dropped like dense hits below similarity_threshold
+        lexical_hits = lexical_index.search(question, educationalStage, historicalEra, k=10,
+                                            min_score=Config.LEXICAL_MIN_SCORE)
+
+    # Short keyword queries (names, dates) without history are answered from BM25 alone
+    keyword_query = (
+        not history and lexical_hits
+        and len(lexical_index.query_terms(question)) <= Config.LEXICAL_FAST_PATH_MAX_TERMS
+    )
+    question_embedding = None
+    if retrieval_mode == 'lexical' or (retrieval_mode == 'hybrid' and keyword_query):
+        ranked_passages = [idx for idx, _ in lexical_hits]
+    else:
+        ranked_passages, question_embedding = denseRanking(question, ml_manager, index, history, educationalStage,
+                                   historicalEra, similarity_threshold, lexical_hits)
+
+    # Greedily pack whole passages, best first, until the word budget is spent
+    max_words = max_words or Config.CHAT_CONTEXT_MAX_WORDS
+    contents = passages['Content'].to_numpy()
+    word_counts = passages['WordCount'].to_numpy()
+
+    packed = []
+    total_words = 0
     
-    # Process history to maintain context
-    history_embeddings = []
-    if history:
-        # Get last 2 Q&A pairs for context
-        recent_history = history[-2:] if len(history) > 2 else history
-        for entry in recent_history:
-            # Combine question and answer to capture full context
-            history_text = f"{entry['question']} {entry['answer']}"
-            history_embeddings.append(model.encode([history_text])[0])
+    for idx in ranked_passages:
+        if total_words + word_counts[idx] <= max_words:
+            packed.append(idx)
+            total_words += word_counts[idx]
+
+    # Keyword queries never computed an embedding, their few passages are sent as is
+    if compressor is not None and question_embedding is not None and Config.CHAT_COMPRESSED_CONTEXT_WORDS:
+        return compressor.compress_passages(question_embedding, packed, Config.CHAT_COMPRESSED_CONTEXT_WORDS)
+    
+    return [contents[idx] for idx in packed]
+
+def denseRanking(question, ml_manager, index, history, educationalStage, historicalEra, similarity_threshold, lexical_hits=None):
+    """
+    Rank passages by similarity to the question combined with recent history, keeping those
+    above similarity_threshold, fused with the lexical hits by reciprocal rank when given.
+    Returns (ranked passage positions, question embedding).
+    """
+    # Get last 2 Q&A pairs for context, reusing turn embeddings stored with the session
+    recent_history = history[-2:] if history else []
+    history_embeddings = [entry.get('embedding') for entry in recent_history]
+
+    # Encode the stemmed question and any history turns without a stored embedding in one
+    # batch, combining question and answer to capture the full context of a turn
+    keys = [ml_manager.text_key(question, stem=True)] + [
+        ml_manager.text_key(f"{entry['question']} {entry['answer']}")
+        for entry, embedding in zip(recent_history, history_embeddings) if embedding is None
+    ]
+    encoded = ml_manager.encode_keys(keys)
+    question_embedding = encoded[:1]
+
+    missing = iter(encoded[1:])
+    history_embeddings = [
+        decode_embedding(embedding) if embedding is not None else next(missing)
+        for embedding in history_embeddings
+    ]
     
     # Combine current question embedding with history context
     combined_embedding = combine_embeddings(question_embedding[0], history_embeddings)
     combined_embedding = combined_embedding.reshape(1, -1)
 
-    # Normalize embeddings
-    embedding_matrix = np.vstack(filtered_data['Embeddings'].to_numpy())
-    embedding_matrix = embedding_matrix / np.linalg.norm(embedding_matrix, axis=1, keepdims=True)
-    
-    # Create FAISS index
-    index = faiss.IndexFlatIP(embedding_matrix.shape[1])
-    index.add(embedding_matrix.astype('float32'))
-    
-    # Search with combined embedding
-    D, I = index.search(combined_embedding.astype('float32'), 20)
+    # Search only the matching partition of the prebuilt index
+    hits = index.search(combined_embedding, educationalStage, historicalEra, k=20)
+    dense_hits = [(idx, similarity) for idx, similarity in hits if 100 * similarity >= similarity_threshold]
 
-    # Collect content until reaching maximum word count
-    top_results = []
-    total_words = 0
-    
-    for idx, similarity in zip(I[0], 100 * D[0]):
-        if similarity >= similarity_threshold:
-            content = filtered_data.iloc[idx]['Content']
-            if content and str(content) != 'nan':
-                content_words = str(content).split()
-                words_remaining = max_words - total_words
-                
-                if len(content_words) <= words_remaining:
-                    top_results.append(str(content))
-                    total_words += len(content_words)
-                else:
-                    truncated_content = ' '.join(content_words[:words_remaining])
-                    if not truncated_content.endswith('.'):
-                        truncated_content += '.'
-                    top_results.append(truncated_content)
-                    total_words = max_words
-                    break
-    
-    return top_results
+    if lexical_hits:
+        return [idx for idx, _ in reciprocal_rank_fusion(dense_hits, lexical_hits)], question_embedding[0]
+    return [idx for idx, _ in dense_hits], question_embedding[0]
 
-def answer_question_with_relevant_content_GN(email, query, session_manager, data, model, session_nonce, EducationalStage=None, HistoricalEra=None, Topic=None):
+def build_chat_messages(email, query, session_manager, data, passages, ml_manager, index, session_nonce, EducationalStage=None, HistoricalEra=None, Topic=None):
+    """Retrieve the context for a question and build the LLM messages with the session history."""
     session = session_manager.get_session(email, session_nonce)
     history = session["content"] if session else []
     history_text = "\n".join([f"Q: {entry['question']}\nA: {entry['answer']}" for entry in history])
 
+    compressor = ml_manager.get_context_compressor()
+
     if Topic is not None:
-        relevant_content = getTopic(Topic, data, EducationalStage)
-        relevant_content = relevant_content['Content'].values[0]
+        topic_rows = getTopic(Topic, data, EducationalStage)
+        relevant_content = topic_rows['Content'].values[0]
+
+        # Send only the parts of the topic closest to the question
+        if compressor is not None and Config.CHAT_COMPRESSED_CONTEXT_WORDS:
+            question_embedding = ml_manager.encode_text(query, stem=True)
+            compressed = compressor.compress_row(
+                question_embedding, data.index.get_loc(topic_rows.index[0]), Config.CHAT_COMPRESSED_CONTEXT_WORDS)
+            relevant_content = compressed or relevant_content
     else:
         # Get relevant content using both query and history
         relevant_content_results = relevantContent(
             query, 
-            model, 
-            data, 
+            ml_manager, 
+            passages, 
+            index,
             history=history,  # Pass conversation history
             educationalStage=EducationalStage, 
-            historicalEra=HistoricalEra
+            historicalEra=HistoricalEra,
+            lexical_index=ml_manager.get_lexical_index(),
+            compressor=compressor
         )
         
         relevant_content = "\n".join(relevant_content_results) if relevant_content_results else ""
@@ -206,12 +262,39 @@ def answer_question_with_relevant_content_GN(email, query, session_manager, data
             Focus on clarity and appropriate examples for this educational level."""},
         {"role": "user", "content": prompt}
     ]
+    return messages
 
-    # Get response from the model
-    response = chat_completion(messages, model=DEFAULT_MODEL)
+def save_chat_turn(email, query, response, session_manager, ml_manager, session_nonce, EducationalStage=None, Topic=None):
+    # Embed the finished turn once so later questions reuse it instead of re-encoding the answer
+    turn_embedding = None
+    if Topic is None:
+        turn_embedding = ml_manager.encode_texts([f"{query} {response}"], cache=False)[0]
 
     # Save the interaction using session manager
     session_manager.add_to_session(
-        email, EducationalStage, session_nonce, query, response)
+        email, EducationalStage, session_nonce, query, response, embedding=turn_embedding)
+
+def answer_question_with_relevant_content_GN(email, query, session_manager, data, passages, ml_manager, index, session_nonce, EducationalStage=None, HistoricalEra=None, Topic=None):
+    messages = build_chat_messages(email, query, session_manager, data, passages, ml_manager, index,
+                                   session_nonce, EducationalStage, HistoricalEra, Topic)
+
+    # Get response from the model
+    response = chat_completion(messages, model=DEFAULT_MODEL)
 
+    save_chat_turn(email, query, response, session_manager, ml_manager, session_nonce, EducationalStage, Topic)
     return response
+
+def stream_answer_with_relevant_content_GN(email, query, session_manager, data, passages, ml_manager, index, session_nonce, EducationalStage=None, HistoricalEra=None, Topic=None):
+    """
+    Same as answer_question_with_relevant_content_GN, but yields the answer's text as the
+    model streams it. The completed answer is saved to the session once the stream ends.
+    """
+    messages = build_chat_messages(email, query, session_manager, data, passages, ml_manager, index,
+                                   session_nonce, EducationalStage, HistoricalEra, Topic)
+
+    chunks = []
+    for delta in chat_completion_stream(messages, model=DEFAULT_MODEL):
+        chunks.append(delta)
+        yield delta
+
+    save_chat_turn(email, query, ''.join(chunks), session_manager, ml_manager, session_nonce, EducationalStage, Topic)
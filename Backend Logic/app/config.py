@@ -19,12 +19,95 @@ class Config:
         EMBEDDINGS_DIR, 'merged_data_with_alibaba_embeddings.pkl')
     PERSONALITY_FILE = os.path.join(EMBEDDINGS_DIR, 'person_embeddings.pkl')
     EVENTS_DATA_FILE = os.path.join(EMBEDDINGS_DIR, 'dates_events_with_embeddings.pkl')
-    FAISS_INDEX_FILE = os.path.join(EMBEDDINGS_DIR, 'faiss_index.pkl')
+
+    # FAISS index artifact built from EMBEDDINGS_FILE, bump the version when its layout changes
+    FAISS_INDEX_VERSION = 4
+    FAISS_INDEX_FILE = os.path.join(EMBEDDINGS_DIR, f'faiss_index.v{FAISS_INDEX_VERSION}.index')
+    FAISS_ID_MAP_FILE = os.path.join(EMBEDDINGS_DIR, f'faiss_index.v{FAISS_INDEX_VERSION}.ids.json')
+    FAISS_VECTORS_FILE = os.path.join(EMBEDDINGS_DIR, f'faiss_index.v{FAISS_INDEX_VERSION}.vectors.npy')
+    FAISS_SENTENCES_FILE = os.path.join(EMBEDDINGS_DIR, f'faiss_index.v{FAISS_INDEX_VERSION}.sentences.npy')
+    # Text columns of the corpus, passages and sentences, formatted with e.g. 'corpus.text' / 'corpus.offsets'
+    FAISS_TEXT_FILE = os.path.join(EMBEDDINGS_DIR, f'faiss_index.v{FAISS_INDEX_VERSION}.{{}}.npy')
+
+    # Chat retriever index: 'flat' (exact), 'hnsw' or 'ivf' (approximate),
+    # compare settings with `python -m benchmarks.retrieval`
+    CHAT_INDEX_TYPE = 'flat'
+    HNSW_M = 32
+    HNSW_EF_CONSTRUCTION = 200
+    HNSW_EF_SEARCH = 64
+    IVF_NLIST = 64
+    IVF_NPROBE = 8
+
+    # Content is split offline into passages of at most this many words, the chat
+    # context is packed from whole passages up to CHAT_CONTEXT_MAX_WORDS
+    PASSAGE_MAX_WORDS = 120
+    CHAT_CONTEXT_MAX_WORDS = 1000
+
+    # The packed context (or a whole topic) is then compressed to the sentences most
+    # similar to the question within this word budget, None disables compression
+    CHAT_COMPRESSED_CONTEXT_WORDS = 400
+
+    # Chat retrieval: 'dense', 'lexical' (BM25) or 'hybrid' (reciprocal rank fusion of both).
+    # Hybrid is opt-in until it has been evaluated against dense on real questions. BM25 hits
+    # scoring at most LEXICAL_MIN_SCORE are dropped, and in hybrid mode keyword queries of
+    # at most LEXICAL_FAST_PATH_MAX_TERMS terms skip the transformer entirely
+    CHAT_RETRIEVAL_MODE = 'dense'
+    LEXICAL_MIN_SCORE = 2.0
+    LEXICAL_FAST_PATH_MAX_TERMS = 3
+
+    # Chat sessions: 'sqlite' (SESSION_DB_FILE, sessions.json is imported into it once) or 'json'
+    SESSION_BACKEND = 'sqlite'
+    SESSION_JSON_FILE = 'sessions.json'
+    SESSION_DB_FILE = 'sessions.db'
 
     # Caching configuration
+    # Exact-match /ask answers: RESPONSE_CACHE_SIZE in memory, written through to a SQLite file,
+    # served for RESPONSE_CACHE_TTL seconds
     RESPONSE_CACHE_SIZE = 1000
+    RESPONSE_CACHE_FILE = 'response_cache.db'
+    RESPONSE_CACHE_DISK_SIZE = 50000
+    RESPONSE_CACHE_TTL = 7 * 24 * 60 * 60
     EMBEDDING_CACHE_SIZE = 5000
 
+    # First-turn /ask answers are reused for questions in the same stage, era and topic
+    # whose embedding has at least this cosine similarity, for up to SEMANTIC_CACHE_TTL seconds
+    SEMANTIC_CACHE_SIZE = 2000
+    SEMANTIC_CACHE_TTL = 24 * 60 * 60
+    SEMANTIC_CACHE_THRESHOLD = 0.92
+
+    # Progress files are updated through an append-only journal, fsync'd at most every
+    # PROGRESS_FSYNC_BATCH records or PROGRESS_FSYNC_INTERVAL seconds, and compacted into
+    # the JSON snapshot every PROGRESS_SNAPSHOT_INTERVAL seconds. False rewrites the file on every update
+    PROGRESS_WRITE_BEHIND = True
+    PROGRESS_FSYNC_INTERVAL = 0.05
+    PROGRESS_FSYNC_BATCH = 32
+    PROGRESS_SNAPSHOT_INTERVAL = 60
+    # Embeddings of answered questions, kept out of the progress files
+    ANSWERED_EMBEDDINGS_FILE = 'answered_embeddings.db'
+
+    # Ready quizzes kept per (educational stage, level), generated in the background
+    QUIZ_POOL_SIZE = 3
+    QUIZ_POOL_QUESTIONS = 5
+    QUIZ_GENERATION_ATTEMPTS = 4
+
+    # Generated questions are kept in a SQLite bank shared by all users, a new question is
+    # dropped as a duplicate at this cosine similarity to a banked one, and a banked question
+    # counts as seen by a user at this similarity to one of their answered questions.
+    # Prefill it offline with `python prefill_question_bank.py`
+    QUESTION_BANK_FILE = 'question_bank.db'
+    QUESTION_BANK_DEDUPE_THRESHOLD = 0.95
+    QUESTION_BANK_SEEN_THRESHOLD = 0.9
+
+    # Served quizzes are kept server-side with their answer key for grading, in a SQLite file
+    # every worker process reads, for QUIZ_STORE_TTL seconds
+    QUIZ_STORE_FILE = 'quizzes.db'
+    QUIZ_STORE_TTL = 60 * 60
+    QUIZ_STORE_SIZE = 10000
+
+    # Generate questions, options and answers in one JSON-mode call, the two-call
+    # text pipeline is only used when that fails
+    QUIZ_JSON_MODE = True
+
     # Performance settings
     GPU_ENABLED = True  # Will fallback to CPU if GPU is not available
     MAX_WORKERS = 4     # Number of thread workers for concurrent operations
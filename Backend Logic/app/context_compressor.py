@@ -0,0 +1,61 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+
+class ContextCompressor:
+    """Extractive compression of retrieved text using precomputed sentence embeddings.
+
+    Sentences (from passages.build_passages) are stored grouped by row and
+    passage, so the sentences of a passage or a row are a contiguous slice of
+    the normalized embedding matrix.
+    """
+
+    def __init__(self, sentences: pd.DataFrame, embeddings: np.ndarray):
+        self.contents = sentences['Content'].to_numpy()
+        self.word_counts = sentences['WordCount'].to_numpy()
+        self.embeddings = embeddings
+
+        passage_ids = sentences['Passage'].to_numpy()
+        row_ids = sentences['Row'].to_numpy()
+        n_passages = int(passage_ids.max()) + 1 if len(passage_ids) else 0
+        n_rows = int(row_ids.max()) + 1 if len(row_ids) else 0
+        self.passage_bounds = np.searchsorted(passage_ids, np.arange(n_passages + 1))
+        self.row_bounds = np.searchsorted(row_ids, np.arange(n_rows + 1))
+
+    def _select(self, query_embedding, groups: List[np.ndarray], max_words: int) -> List[str]:
+        """Keep the sentences most similar to the query within max_words, in their original order."""
+        sentence_ids = np.concatenate(groups) if groups else np.array([], dtype='int64')
+        if not len(sentence_ids):
+            return []
+
+        query = np.asarray(query_embedding, dtype='float32').reshape(-1)
+        query = query / np.linalg.norm(query)
+        scores = self.embeddings[sentence_ids] @ query
+
+        keep = set()
+        total_words = 0
+        for i in np.argsort(-scores):
+            words = self.word_counts[sentence_ids[i]]
+            if total_words + words <= max_words:
+                keep.add(sentence_ids[i])
+                total_words += words
+
+        return [
+            ' '.join(self.contents[s] for s in group if s in keep)
+            for group in groups if any(s in keep for s in group)
+        ]
+
+    def compress_passages(self, query_embedding, passage_ids: List[int], max_words: int) -> List[str]:
+        """Compress ranked passages, returning the kept text of each passage that keeps any."""
+        groups = [np.arange(self.passage_bounds[p], self.passage_bounds[p + 1]) for p in passage_ids
+                  if p + 1 < len(self.passage_bounds)]
+        return self._select(query_embedding, groups, max_words)
+
+    def compress_row(self, query_embedding, row: int, max_words: int) -> str:
+        """Compress the whole Content of one corpus row, e.g. a topic."""
+        if row + 1 >= len(self.row_bounds):
+            return ""
+        group = np.arange(self.row_bounds[row], self.row_bounds[row + 1])
+        return ' '.join(self._select(query_embedding, [group], max_words))
@@ -0,0 +1,13 @@
+import base64
+
+import numpy as np
+
+
+def encode_embedding(embedding) -> str:
+    """Pack an embedding as base64 float16, about a sixth of its JSON list size."""
+    return base64.b64encode(np.asarray(embedding, dtype='float16').tobytes()).decode('ascii')
+
+
+def decode_embedding(encoded: str) -> np.ndarray:
+    """Unpack a base64 float16 embedding back into a float32 vector."""
+    return np.frombuffer(base64.b64decode(encoded), dtype='float16').astype('float32')
@@ -1,48 +1,83 @@
-import json
-import os
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import Config
+from .persistence import JsonFile
+from .progress_store import ProgressStore
+from .solved_ids import add_solved
 
 class EventsProgressManager:
-    def __init__(self, progress_file: str = "events_progress.json"):
+    def __init__(self, progress_file: str = "events_progress.json",
+                 legacy_row_ids: Optional[Callable[[str, List[Dict]], List[int]]] = None):
         self.progress_file = progress_file
-        self._load_progress()
-
-    def _load_progress(self):
-        if os.path.exists(self.progress_file):
-            with open(self.progress_file, 'r', encoding='utf-8') as f:
-                self.progress_data = json.load(f)
+        # Maps a stage's old solved_questions list to dataset row ids, used once to migrate it
+        self.legacy_row_ids = legacy_row_ids
+        # Journal each changed stage and snapshot in the background instead of rewriting the file
+        if Config.PROGRESS_WRITE_BEHIND:
+            self.store = ProgressStore(self.progress_file)
         else:
-            self.progress_data = {}
-            self._save_progress()
+            self.store = JsonFile(self.progress_file)
+        self._migrate_legacy()
+
+    @property
+    def progress_data(self) -> dict:
+        """The progress of every user, as last written by any worker process."""
+        return self.store.read()
+
+    def _legacy_stages(self) -> List[Tuple[str, str]]:
+        return [
+            (email, educational_stage)
+            for email, user_data in self.progress_data.items()
+            for educational_stage, stage_data in user_data.items()
+            if "solved_questions" in stage_data
+        ]
 
-    def _save_progress(self):
-        with open(self.progress_file, 'w', encoding='utf-8') as f:
-            json.dump(self.progress_data, f, ensure_ascii=False, indent=4)
+    def _migrate_legacy(self):
+        """Replace the {date, event} dicts stages used to store with sorted dataset row ids."""
+        if self.legacy_row_ids is None or not self._legacy_stages():
+            return
+        with self.store.update():
+            for email, educational_stage in self._legacy_stages():
+                stage_data = self.progress_data[email][educational_stage]
+                solved_ids = stage_data.setdefault("solved_ids", [])
+                add_solved(solved_ids, self.legacy_row_ids(educational_stage, stage_data.pop("solved_questions")))
+                self._save_progress(email, educational_stage)
 
-    def get_solved_questions(self, email: str, educational_stage: str) -> List[Dict]:
-        return self.progress_data.get(email, {}).get(educational_stage, {}).get("solved_questions", [])
+    def _save_progress(self, *path):
+        """Persist the subtree at path, e.g. (email, stage). Call inside self.store.update()."""
+        node = self.progress_data
+        for key in path:
+            node = node[key]
+        self.store.record(path, node)
 
-    def update_progress(self, email: str, educational_stage: str, question_data: Dict, is_correct: bool) -> Dict:
-        if email not in self.progress_data:
-            self.progress_data[email] = {}
+    def get_solved_ids(self, email: str, educational_stage: str) -> List[int]:
+        """Sorted dataset row ids of the events solved in a stage."""
+        with self.store.reading():
+            return list(self.progress_data.get(email, {}).get(educational_stage, {}).get("solved_ids", []))
+
+    def update_progress(self, email: str, educational_stage: str, question_id: int, is_correct: bool) -> Dict:
+        return self.update_progress_batch(email, educational_stage, [(question_id, is_correct)])
+
+    def update_progress_batch(self, email: str, educational_stage: str, answers: List[Tuple[int, bool]]) -> Dict:
+        """Apply all (question_id, is_correct) answers of a submission with a single save."""
+        with self.store.update():
+            if email not in self.progress_data:
+                self.progress_data[email] = {}
             
-        if educational_stage not in self.progress_data[email]:
-            self.progress_data[email][educational_stage] = {
-                "solved_questions": [],
-                "total_attempts": 0,
-                "correct_answers": 0
-            }
+            if educational_stage not in self.progress_data[email]:
+                self.progress_data[email][educational_stage] = {
+                    "solved_ids": [],
+                    "total_attempts": 0,
+                    "correct_answers": 0
+                }
             
-        progress = self.progress_data[email][educational_stage]
+            progress = self.progress_data[email][educational_stage]
         
-        if is_correct:
-            progress["correct_answers"] += 1
-            progress["solved_questions"].append({
-                "date": question_data["date"],
-                "event": question_data["event"]
-            })
-            
-        progress["total_attempts"] += 1
+            for question_id, is_correct in answers:
+                if is_correct:
+                    progress["correct_answers"] += 1
+                    add_solved(progress.setdefault("solved_ids", []), [question_id])
+                
+                progress["total_attempts"] += 1
         
-        self._save_progress()
-        return progress
+            self._save_progress(email, educational_stage)
+            return dict(progress, solved_ids=list(progress["solved_ids"]))
@@ -4,6 +4,7 @@ from datetime import datetime
 import random
 from typing import List, Dict
 from .config import Config
+from .solved_ids import unsolved
 
 class EventsQuizManager:
     def __init__(self):
@@ -11,30 +12,43 @@ class EventsQuizManager:
         self.data = pd.read_pickle(Config.EVENTS_DATA_FILE)
         self.embeddings = np.vstack(self.data['embeddings'].apply(
             lambda x: np.array(x, dtype=np.float32)).values)
+        # Row ids of each stage, solved events are stored as these ids
+        self.stage_rows = {
+            stage: rows.to_numpy(dtype=np.int64)
+            for stage, rows in self.data.groupby('Educational stage').groups.items()
+        }
 
-    def generate_quiz(self, educational_stage: str, solved_questions: List[Dict], num_questions: int = 5) -> List[Dict]:
+    def is_stage_row(self, educational_stage: str, row_id) -> bool:
+        """Whether row_id is a row of the stage, as the question ids generate_quiz hands out are."""
+        rows = self.stage_rows.get(educational_stage)
+        if rows is None or isinstance(row_id, bool) or not isinstance(row_id, (int, np.integer)):
+            return False
+        return bool((rows == row_id).any())
+
+    def legacy_row_ids(self, educational_stage: str, solved_questions: List[Dict]) -> List[int]:
+        """Row ids of solved events stored the old way, as {date, event} dicts."""
         filtered_data = self.data[self.data['Educational stage'] == educational_stage]
-        
-        # Get indices of solved questions
-        solved_indices = set()
-        for solved in solved_questions:
-            matching_rows = filtered_data[
-                (filtered_data['Date'] == solved['date']) & 
-                (filtered_data['Content'] == solved['event'])
-            ].index
-            solved_indices.update(matching_rows)
+        rows = {}
+        for idx, date, content in zip(filtered_data.index, filtered_data['Date'], filtered_data['Content']):
+            rows.setdefault((date, content), []).append(int(idx))
+        return [idx for solved in solved_questions for idx in rows.get((solved['date'], solved['event']), [])]
+
+    def solved_events(self, solved_ids: List[int]) -> List[Dict]:
+        rows = self.data.loc[solved_ids]
+        return [{"date": date, "event": content} for date, content in zip(rows['Date'], rows['Content'])]
+
+    def generate_quiz(self, educational_stage: str, solved_ids: List[int], num_questions: int = 5) -> List[Dict]:
+        available_indices = unsolved(self.stage_rows.get(educational_stage, np.zeros(0, dtype=np.int64)), solved_ids)
 
         # Generate new questions
         questions = []
-        available_indices = list(set(filtered_data.index) - solved_indices)
-        
         if len(available_indices) < num_questions:
             return []  # Not enough unique questions available
 
-        selected_indices = random.sample(available_indices, num_questions)
+        selected_indices = random.sample(available_indices.tolist(), num_questions)
         
         for idx in selected_indices:
-            row = filtered_data.loc[idx]
+            row = self.data.loc[idx]
             
             # If date contains hyphen (interval), force type 0 (date→event)
             # Otherwise randomly choose between type 0 and 1
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import pickle
+
+import faiss
+import numpy as np
+import pandas as pd
+
+from .config import Config
+from .context_compressor import ContextCompressor
+from .lexical_index import light_stem_text
+from .passages import build_passages
+from .persistence import file_lock
+from .vector_index import VectorIndex
+
+# Bulk text columns, stored as UTF-8 buffers instead of in the ID map
+TEXT_COLUMNS = ('Content', 'stemmedTashContent')
+# Stands for a missing value, the byte never occurs in UTF-8 text
+NULL = b'\xff'
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Hash a file in chunks so large pickles are never held in memory twice."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _replace_atomically(path, write):
+    """Write through a temp file so readers never see a half-written artifact."""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _encode_strings(values):
+    """Pack strings as one UTF-8 buffer and the n + 1 offsets delimiting them, missing values as NULL."""
+    encoded = [NULL if pd.isnull(value) else str(value).encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype='int64')
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype='uint8'), offsets
+
+
+def _decode_strings(buffer: bytes, offsets) -> list:
+    """The strings packed by _encode_strings, None for missing values."""
+    values = [buffer[start:end] for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+    return [None if value == NULL else value.decode('utf-8') for value in values]
+
+
+def _write_array(array):
+    def write(p):
+        with open(p, 'wb') as f:
+            np.save(f, array)
+    return write
+
+
+def _write_frame(name: str, frame: pd.DataFrame) -> dict:
+    """Write the frame's text columns as one UTF-8 buffer and their offsets, returning the ID map entry for the rest."""
+    text_columns = [column for column in TEXT_COLUMNS if column in frame.columns]
+    buffers, offsets, size = [], [], 0
+    for column in text_columns:
+        buffer, column_offsets = _encode_strings(frame[column])
+        buffers.append(buffer)
+        offsets.append(column_offsets + size)
+        size += len(buffer)
+
+    buffer = np.concatenate(buffers) if buffers else np.zeros(0, dtype='uint8')
+    offsets = np.vstack(offsets) if offsets else np.zeros((0, len(frame) + 1), dtype='int64')
+    _replace_atomically(Config.FAISS_TEXT_FILE.format(f'{name}.text'), _write_array(buffer))
+    _replace_atomically(Config.FAISS_TEXT_FILE.format(f'{name}.offsets'), _write_array(offsets))
+    return {
+        "columns": list(frame.columns),
+        "text_columns": text_columns,
+        "table": frame.drop(columns=text_columns).to_dict(orient='split'),
+    }
+
+
+def _load_frame(name: str, entry: dict) -> pd.DataFrame:
+    """Rebuild a frame written by _write_frame, its text columns decoded into plain object columns."""
+    table = entry["table"]
+    frame = pd.DataFrame(table["data"], index=table["index"], columns=table["columns"])
+    buffer = np.load(Config.FAISS_TEXT_FILE.format(f'{name}.text')).tobytes()
+    offsets = np.load(Config.FAISS_TEXT_FILE.format(f'{name}.offsets'))
+    for column, column_offsets in zip(entry["text_columns"], offsets):
+        frame[column] = pd.Series(_decode_strings(buffer, column_offsets), index=frame.index, dtype=object)
+    return frame[entry["columns"]]
+
+
+def build_index_files(data: pd.DataFrame, source_hash: str, encode):
+    """Chunk data into passages and sentences, index them and write the artifact files.
+
+    encode embeds a list of texts (SentenceTransformer.encode). Passages and
+    sentences are embedded from their light-stemmed text, as chat questions are.
+    Returns (VectorIndex over passages, passages, ContextCompressor).
+    """
+    passages, sentences = build_passages(data, Config.PASSAGE_MAX_WORDS)
+    passages['stemmedTashContent'] = [light_stem_text(text) for text in passages['Content']]
+    passages['Embeddings'] = list(np.asarray(encode(passages['stemmedTashContent'].tolist()), dtype='float32'))
+    vector_index = VectorIndex.build(passages)
+    passages = passages.drop(columns=['Embeddings'])
+
+    # Sentence embeddings are computed once here, the chat only scores them
+    sentence_vectors = VectorIndex.normalize(encode([light_stem_text(text) for text in sentences['Content']]))
+
+    vectors = np.vstack(data['Embeddings'].to_numpy()).astype('float32')
+
+    os.makedirs(os.path.dirname(Config.FAISS_INDEX_FILE), exist_ok=True)
+    id_map = {
+        "version": Config.FAISS_INDEX_VERSION,
+        "source_sha256": source_hash,
+        "index_type": Config.CHAT_INDEX_TYPE,
+        "passage_max_words": Config.PASSAGE_MAX_WORDS,
+        "ids": vector_index.ids.tolist(),
+        "partitions": [[stage, era, start, end] for (stage, era), (start, end) in vector_index.partitions.items()],
+        "columns": list(data.columns),
+        "corpus": _write_frame('corpus', data.drop(columns=['Embeddings'])),
+        "passages": _write_frame('passages', passages),
+        "sentences": _write_frame('sentences', sentences),
+    }
+
+    _replace_atomically(Config.FAISS_INDEX_FILE, lambda p: faiss.write_index(vector_index.index, p))
+    _replace_atomically(Config.FAISS_VECTORS_FILE, _write_array(vectors))
+    _replace_atomically(Config.FAISS_SENTENCES_FILE, _write_array(sentence_vectors))
+
+    # The ID map goes last: it carries the hash, so a crash mid-build leaves it stale
+    def write_id_map(p):
+        with open(p, 'w', encoding='utf-8') as f:
+            json.dump(id_map, f, ensure_ascii=False)
+    _replace_atomically(Config.FAISS_ID_MAP_FILE, write_id_map)
+
+    return vector_index, passages, ContextCompressor(sentences, sentence_vectors)
+
+
+def load_index_files(source_hash: str):
+    """Memory-map a fresh artifact, returning (VectorIndex, data, passages, ContextCompressor)
+    or None if missing or stale."""
+    paths = (Config.FAISS_INDEX_FILE, Config.FAISS_ID_MAP_FILE, Config.FAISS_VECTORS_FILE,
+             Config.FAISS_SENTENCES_FILE) + tuple(
+        Config.FAISS_TEXT_FILE.format(f'{frame}.{part}')
+        for frame in ('corpus', 'passages', 'sentences') for part in ('text', 'offsets'))
+    if not all(os.path.exists(p) for p in paths):
+        return None
+
+    try:
+        with open(Config.FAISS_ID_MAP_FILE, 'r', encoding='utf-8') as f:
+            id_map = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading FAISS ID map: {e}")
+        return None
+
+    if (id_map.get("version") != Config.FAISS_INDEX_VERSION
+            or id_map.get("source_sha256") != source_hash
+            or id_map.get("index_type") != Config.CHAT_INDEX_TYPE
+            or id_map.get("passage_max_words") != Config.PASSAGE_MAX_WORDS):
+        return None
+
+    index = faiss.read_index(Config.FAISS_INDEX_FILE, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    partitions = {(stage, era): (start, end) for stage, era, start, end in id_map["partitions"]}
+    vector_index = VectorIndex(index, np.array(id_map["ids"], dtype='int64'), partitions)
+
+    # Only the vectors are memory-mapped and shared by every worker process, the text is small
+    vectors = np.load(Config.FAISS_VECTORS_FILE, mmap_mode='r')
+    data = _load_frame('corpus', id_map["corpus"])
+    data['Embeddings'] = list(vectors)
+    data = data[id_map["columns"]]
+
+    passages = _load_frame('passages', id_map["passages"])
+    sentences = _load_frame('sentences', id_map["sentences"])
+    compressor = ContextCompressor(sentences, np.load(Config.FAISS_SENTENCES_FILE, mmap_mode='r'))
+
+    return vector_index, data, passages, compressor
+
+
+def load_or_build_index(source_file: str, encode):
+    """Return (VectorIndex, data, passages, ContextCompressor), rebuilding the artifact only when the source pickle changed."""
+    source_hash = file_sha256(source_file)
+
+    loaded = load_index_files(source_hash)
+    if loaded is not None:
+        print("Loaded FAISS index from:", Config.FAISS_INDEX_FILE)
+        return loaded
+
+    # Worker processes starting together wait for the first one's build instead of repeating it
+    with file_lock(Config.FAISS_ID_MAP_FILE):
+        loaded = load_index_files(source_hash)
+        if loaded is not None:
+            print("Loaded FAISS index from:", Config.FAISS_INDEX_FILE)
+            return loaded
+
+        print("FAISS index missing or stale, rebuilding from:", source_file)
+        with open(source_file, 'rb') as f:
+            data = pickle.load(f)
+        build_index_files(data, source_hash, encode)
+        print("FAISS index written to:", Config.FAISS_INDEX_FILE)
+
+    # Map the fresh files like every other worker rather than keeping the unpickled corpus
+    return load_index_files(source_hash)
@@ -0,0 +1,125 @@
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from tashaphyne.stemming import ArabicLightStemmer
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# ArabicLightStemmer keeps per-word state on the instance, so share one behind a lock
+_stemmer = ArabicLightStemmer()
+_stemmer_lock = threading.Lock()
+
+
+def light_stem_text(text) -> str:
+    """Light-stem every whitespace-separated word, as the stemmedTashContent column was built."""
+    with _stemmer_lock:
+        return ' '.join(_stemmer.light_stem(word) for word in str(text).split())
+
+
+def tokenize(stemmed_text) -> List[str]:
+    return TOKEN_PATTERN.findall(str(stemmed_text).lower())
+
+
+class _Partition:
+    """Inverted index with BM25 statistics over the documents of one stage."""
+
+    def __init__(self, rows: np.ndarray, eras: np.ndarray, documents: List[List[str]]):
+        self.rows = rows
+        self.eras = eras
+        self.lengths = np.array([len(doc) for doc in documents], dtype='float32')
+        self.avg_length = float(self.lengths.mean()) if len(documents) else 0.0
+
+        postings = {}
+        for position, doc in enumerate(documents):
+            for term, tf in Counter(doc).items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(position)
+                postings[term][1].append(tf)
+
+        n = len(documents)
+        self.postings = {}
+        for term, (positions, tfs) in postings.items():
+            idf = np.log(1 + (n - len(positions) + 0.5) / (len(positions) + 0.5))
+            self.postings[term] = (np.array(positions), np.array(tfs, dtype='float32'), idf)
+
+
+class LexicalIndex:
+    """In-memory BM25 index over the stemmed corpus, partitioned by educational stage.
+
+    Documents are the `stemmedTashContent` column (Tashaphyne light stems) or
+    the light-stemmed Content when it is missing, queries are light-stemmed
+    the same way so their terms match.
+    """
+
+    def __init__(self, partitions: Dict[str, _Partition], k1: float = 1.5, b: float = 0.75):
+        self.partitions = partitions
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(cls, data: pd.DataFrame) -> 'LexicalIndex':
+        positions = np.flatnonzero(data['Content'].notnull().to_numpy())
+        rows = data.iloc[positions]
+
+        if 'stemmedTashContent' in rows.columns:
+            texts = rows['stemmedTashContent'].where(rows['stemmedTashContent'].notnull(), rows['Content'])
+        else:
+            texts = rows['Content'].map(light_stem_text)
+
+        stages = rows['EducationalStage'].astype(str).to_numpy()
+        eras = rows['HistoricalEra'].astype(str).to_numpy()
+        documents = [tokenize(text) for text in texts]
+
+        partitions = {}
+        for stage in np.unique(stages):
+            mask = stages == stage
+            partitions[stage] = _Partition(
+                positions[mask], eras[mask], [doc for doc, keep in zip(documents, mask) if keep])
+        return cls(partitions)
+
+    def query_terms(self, question: str) -> List[str]:
+        return tokenize(light_stem_text(question))
+
+    def search(self, question: str, educational_stage: Optional[str] = None,
+               historical_era: Optional[str] = None, k: int = 20,
+               min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """Return (row position, BM25 score) pairs best first, only for documents scoring above min_score."""
+        terms = self.query_terms(question)
+        if not historical_era or historical_era == 'None':
+            historical_era = None
+
+        if educational_stage:
+            partitions = [self.partitions[educational_stage]] if educational_stage in self.partitions else []
+        else:
+            partitions = list(self.partitions.values())
+
+        hits = []
+        for partition in partitions:
+            scores = np.zeros(len(partition.rows), dtype='float32')
+            for term in terms:
+                if term not in partition.postings:
+                    continue
+                docs, tfs, idf = partition.postings[term]
+                norm = self.k1 * (1 - self.b + self.b * partition.lengths[docs] / partition.avg_length)
+                scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+            if historical_era:
+                scores[partition.eras != historical_era] = 0
+            top = np.flatnonzero(scores > max(min_score, 0))
+            hits.extend((int(partition.rows[i]), float(scores[i])) for i in top)
+
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:k]
+
+
+def reciprocal_rank_fusion(*rankings: List[Tuple[int, float]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse ranked (row, score) lists by summing 1 / (k + rank) for every list a row appears in."""
+    fused = {}
+    for ranking in rankings:
+        for rank, (row, _) in enumerate(ranking, start=1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -1,77 +1,94 @@
 from sentence_transformers import SentenceTransformer
 from groq import Groq
-import pickle
-import faiss
 import numpy as np
 import os
-from functools import lru_cache
 from typing import Dict, List
 
+from .answer_cache import SemanticAnswerCache
 from .config import Config
-
-
-class MLManager:
-    _instance = None
-
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(MLManager, cls).__new__(cls)
-            # Load everything in memory on first initialization
-            if not os.path.exists(Config.LOCAL_MODEL_PATH):
-                print(f"Model not found at {Config.LOCAL_MODEL_PATH}, downloading...")
-                # First create the directory if it doesn't exist
-                os.makedirs(os.path.dirname(Config.LOCAL_MODEL_PATH), exist_ok=True)
-                # Download and save the model
-                temp_model = SentenceTransformer(Config.SENTENCE_TRANSFORMER_MODEL, trust_remote_code=True)
-                temp_model.save(Config.LOCAL_MODEL_PATH)
-                print("Model downloaded and saved successfully!")
-
-            print("Loading model from:", Config.LOCAL_MODEL_PATH)
-            cls._instance.embedding_model = SentenceTransformer(
-                Config.LOCAL_MODEL_PATH,
-                trust_remote_code=True
-            )
-            print("Model loaded successfully!")
-
-            # Initialize Groq client
-            cls._instance.groq_client = Groq(api_key=Config.GROQ_API_KEY)
-            cls._instance.DEFAULT_MODEL = "gemma2-9b-it"
-
-            # Load data and create index
-            print("Loading embeddings data from:", Config.EMBEDDINGS_FILE)
-            # print if path exists
-            with open(Config.EMBEDDINGS_FILE, 'rb') as f:
-                cls._instance.data = pickle.load(f)
-
-            # # Build index in memory
-            # print("Building FAISS index...")
-            # vectors = np.vstack(cls._instance.data['Embeddings'].to_numpy())
-            # cls._instance.faiss_index = faiss.IndexFlatL2(vectors.shape[1])
-            # cls._instance.faiss_index.add(vectors.astype('float32'))
-
-            cls._instance.cache = {}
-            print("MLManager initialization complete!")
-        return cls._instance
-
-    def chat_completion(self, messages: List[Dict], temperature: float = 0.5, top_p: float = 0.9) -> str:
-        """Execute chat completion using Groq"""
+from .embedding_cache import EmbeddingCache
+from .index_store import load_or_build_index
+from .lexical_index import LexicalIndex, light_stem_text
+from .response_cache import ResponseCache, response_key
+
+
+def download_embedding_model():
+    """Save the sentence transformer to LOCAL_MODEL_PATH unless it is already there."""
+    if not os.path.exists(Config.LOCAL_MODEL_PATH):
+        print(f"Model not found at {Config.LOCAL_MODEL_PATH}, downloading...")
+        # First create the directory if it doesn't exist
+        os.makedirs(os.path.dirname(Config.LOCAL_MODEL_PATH), exist_ok=True)
+        # Download and save the model
+        temp_model = SentenceTransformer(Config.SENTENCE_TRANSFORMER_MODEL, trust_remote_code=True)
+        temp_model.save(Config.LOCAL_MODEL_PATH)
+        print("Model downloaded and saved successfully!")
+
+
+def load_embedding_model() -> SentenceTransformer:
+    """Load the sentence transformer from LOCAL_MODEL_PATH, downloading it there first if missing."""
+    download_embedding_model()
+    print("Loading model from:", Config.LOCAL_MODEL_PATH)
+    model = SentenceTransformer(Config.LOCAL_MODEL_PATH, trust_remote_code=True)
+    print("Model loaded successfully!")
+    return model
+
+
+class ModelClients:
+    """Embedding and chat completion helpers over embedding_model, embedding_cache and groq_client.
+
+    MLManager sets these up along with the chat index and caches, offline
+    scripts like prefill_question_bank.py set up only these and data, which
+    is all QuizManager uses.
+    """
+
+    DEFAULT_MODEL = "gemma2-9b-it"
+
+    def __init__(self, data=None):
+        self.embedding_model = load_embedding_model()
+        # Query embeddings are cached by their normalized (and optionally stemmed) text
+        self.embedding_cache = EmbeddingCache(Config.EMBEDDING_CACHE_SIZE)
+        self.groq_client = Groq(api_key=Config.GROQ_API_KEY)
+        self.data = data
+
+    def chat_completion(self, messages: List[Dict], temperature: float = 0.5, top_p: float = 0.9,
+                        response_format: Dict = None) -> str:
+        """Execute chat completion using Groq, response_format={"type": "json_object"} enables JSON mode"""
+        kwargs = {"response_format": response_format} if response_format else {}
         response = self.groq_client.chat.completions.create(
             messages=messages,
             model=self.DEFAULT_MODEL,
             temperature=temperature,
             top_p=top_p,
+            **kwargs
         )
         return response.choices[0].message.content
 
-    @lru_cache(maxsize=5000)
-    def encode_text(self, text):
-        return self.embedding_model.encode(text)
+    def text_key(self, text: str, stem: bool = False) -> str:
+        """Normalize whitespace and optionally light-stem every word, as the chat queries are."""
+        return light_stem_text(text) if stem else ' '.join(str(text).split())
+
+    def encode_keys(self, keys: List[str], cache: bool = True) -> np.ndarray:
+        """Embed already-normalized texts, encoding every cache miss in one batched call."""
+        embeddings = [self.embedding_cache.get(key) if cache else None for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+        if missing:
+            encoded = self.embedding_model.encode([keys[i] for i in missing])
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = self.embedding_cache.put(keys[i], embedding) if cache else embedding
 
-    def get_cached_response(self, question):
-        return self.cache.get(question)
+        return np.vstack(embeddings)
 
-    def cache_response(self, question, response):
-        self.cache[question] = response
+    def encode_texts(self, texts: List[str], stem: bool = False, cache: bool = True) -> np.ndarray:
+        return self.encode_keys([self.text_key(text, stem) for text in texts], cache=cache)
+
+    def encode_text(self, text: str, stem: bool = False) -> np.ndarray:
+        """Embed a single text, the returned array is shared and read-only."""
+        key = self.text_key(text, stem)
+        embedding = self.embedding_cache.get(key)
+        if embedding is None:
+            embedding = self.embedding_cache.put(key, self.embedding_model.encode(key))
+        return embedding
 
     def get_model(self):
         return self.embedding_model
@@ -79,5 +96,74 @@ class MLManager:
     def get_data(self):
         return self.data
 
+
+class MLManager(ModelClients):
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MLManager, cls).__new__(cls)
+            # Load everything in memory on first initialization: model, embedding cache and Groq client
+            ModelClients.__init__(cls._instance)
+
+            # Load data and index, memory-mapped from the prebuilt artifact when it
+            # matches the embeddings pickle, rebuilt from the pickle otherwise
+            print("Loading embeddings data from:", Config.EMBEDDINGS_FILE)
+            (cls._instance.faiss_index, cls._instance.data, cls._instance.passages,
+             cls._instance.context_compressor) = load_or_build_index(
+                Config.EMBEDDINGS_FILE, cls._instance.embedding_model.encode)
+
+            # BM25 over the same passages, for hybrid and keyword-only retrieval
+            cls._instance.lexical_index = LexicalIndex.build(cls._instance.passages)
+
+            # Answers to first-turn questions, matched exactly first, then by question similarity
+            cls._instance.response_cache = ResponseCache(
+                Config.RESPONSE_CACHE_FILE, Config.RESPONSE_CACHE_SIZE, Config.RESPONSE_CACHE_DISK_SIZE,
+                Config.RESPONSE_CACHE_TTL)
+            cls._instance.answer_cache = SemanticAnswerCache(
+                Config.SEMANTIC_CACHE_SIZE, Config.SEMANTIC_CACHE_TTL, Config.SEMANTIC_CACHE_THRESHOLD)
+            print("MLManager initialization complete!")
+        return cls._instance
+
+    def __init__(self):
+        # Everything is set up once in __new__
+        pass
+
+    def get_embedding_cache_stats(self) -> dict:
+        return self.embedding_cache.stats()
+
+    def get_cached_response(self, question, educational_stage=None, historical_era=None, topic=None):
+        """Return an earlier answer to the same or a similar question in the same stage, era and topic, or None."""
+        key = response_key(question, educational_stage, historical_era, topic, self.DEFAULT_MODEL)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            return cached
+
+        # The stemmed question embedding is the one the retriever uses, so a miss costs no extra encode.
+        # Semantic hits are not copied into the exact tier, they would outlive SEMANTIC_CACHE_TTL there
+        embedding = self.encode_text(question, stem=True)
+        return self.answer_cache.get(embedding, educational_stage, historical_era, topic)
+
+    def cache_response(self, question, response, educational_stage=None, historical_era=None, topic=None):
+        key = response_key(question, educational_stage, historical_era, topic, self.DEFAULT_MODEL)
+        self.response_cache.put(key, response)
+        embedding = self.encode_text(question, stem=True)
+        self.answer_cache.put(embedding, response, educational_stage, historical_era, topic)
+
+    def get_response_cache_stats(self) -> dict:
+        return self.response_cache.stats()
+
+    def get_answer_cache_stats(self) -> dict:
+        return self.answer_cache.stats()
+
+    def get_passages(self):
+        return self.passages
+
+    def get_context_compressor(self):
+        return self.context_compressor
+
     def get_faiss_index(self):
         return self.faiss_index
+
+    def get_lexical_index(self):
+        return self.lexical_index
@@ -0,0 +1,73 @@
+import re
+from typing import List
+
+import pandas as pd
+
+SENTENCE_END = re.compile(r'(?<=[.!?؟:;\n])\s+')
+
+
+def split_sentences(text) -> List[str]:
+    """Split text after sentence punctuation or line breaks, dropping empty pieces."""
+    return [sentence.strip() for sentence in SENTENCE_END.split(str(text)) if sentence.strip()]
+
+
+def chunk_text(text, max_words: int) -> List[List[str]]:
+    """Group consecutive sentences into passages of at most max_words words.
+
+    Each passage is returned as its list of sentences. A sentence longer than
+    max_words on its own is cut into max_words pieces.
+    """
+    passages, current, current_words = [], [], 0
+    for sentence in split_sentences(text):
+        words = sentence.split()
+        if len(words) > max_words:
+            pieces = [' '.join(words[i:i + max_words]) for i in range(0, len(words), max_words)]
+        else:
+            pieces = [sentence]
+
+        for piece in pieces:
+            piece_words = len(piece.split())
+            if current and current_words + piece_words > max_words:
+                passages.append(current)
+                current, current_words = [], 0
+            current.append(piece)
+            current_words += piece_words
+
+    if current:
+        passages.append(current)
+    return passages
+
+
+def build_passages(data: pd.DataFrame, max_words: int):
+    """Split every row's Content into bounded passages and their sentences, with word counts.
+
+    Returns (passages, sentences). `Row` is the position of the source row in
+    data, the stage and era are copied from it so passages can be indexed and
+    partitioned like rows. `Passage` is the position of a sentence's passage,
+    sentences come out grouped by row and passage, in text order.
+    """
+    passages, sentences = [], []
+    for position, row in enumerate(data.itertuples(index=False)):
+        content = getattr(row, 'Content')
+        if pd.isnull(content) or not str(content).strip():
+            continue
+        for passage_sentences in chunk_text(content, max_words):
+            text = ' '.join(passage_sentences)
+            for sentence in passage_sentences:
+                sentences.append({
+                    "Row": position,
+                    "Passage": len(passages),
+                    "Content": sentence,
+                    "WordCount": len(sentence.split()),
+                })
+            passages.append({
+                "Row": position,
+                "EducationalStage": getattr(row, 'EducationalStage'),
+                "HistoricalEra": getattr(row, 'HistoricalEra'),
+                "Content": text,
+                "WordCount": len(text.split()),
+            })
+    return (
+        pd.DataFrame(passages, columns=["Row", "EducationalStage", "HistoricalEra", "Content", "WordCount"]),
+        pd.DataFrame(sentences, columns=["Row", "Passage", "Content", "WordCount"]),
+    )
@@ -0,0 +1,221 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows, files are then only locked between threads of one process
+    fcntl = None
+
+
+class RWLock:
+    """Reader/writer lock for the threads of one process.
+
+    Any number of threads may read at once, a writer waits for them and
+    blocks new readers. A thread that holds the lock, to read or to write,
+    may take it again for reading, and the writer may take it again for
+    writing.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = {}
+        self._writer = None
+        self._depth = 0
+        self._waiting_writers = 0
+
+    def owned(self) -> bool:
+        """Whether the calling thread holds the write lock."""
+        return self._writer == threading.get_ident()
+
+    def held(self) -> bool:
+        """Whether the calling thread holds the lock at all."""
+        return self.owned() or threading.get_ident() in self._readers
+
+    @contextmanager
+    def read(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            yield
+            return
+        with self._cond:
+            if me not in self._readers:
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers[me] -= 1
+                if not self._readers[me]:
+                    del self._readers[me]
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._depth += 1
+            else:
+                self._waiting_writers += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._waiting_writers -= 1
+                self._writer = me
+                self._depth = 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._depth -= 1
+                if not self._depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+@contextmanager
+def file_lock(path: str, exclusive: bool = True):
+    """Advisory fcntl lock on path + '.lock', shared between the app's worker processes."""
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def atomic_write(path: str, text: str):
+    """Write text to a temporary file next to path and rename it over path.
+
+    Readers see either the old or the new file, never a partial one.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(
+        directory, f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def file_stamp(path: str):
+    """(mtime_ns, inode, size) of path, None if it does not exist. Changes whenever the file is replaced."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+
+class JsonFile:
+    """A JSON document shared by the threads and worker processes of the app.
+
+    read() returns the parsed document and only parses the file again when
+    its stamp changed, i.e. another process wrote it. update() holds the
+    write lock and an exclusive file lock while a copy of the document is
+    changed, then writes it back with atomic_write unless it serializes to the
+    text already on disk. A document read() returned is never changed, so
+    callers can iterate it without holding a lock. on_load can convert the freshly parsed document, json_default
+    serializes whatever on_load turned into other types.
+    """
+
+    def __init__(self, path: str, indent: int = 4, on_load: Optional[Callable] = None,
+                 json_default: Optional[Callable] = None):
+        self.path = os.path.abspath(path)
+        self.indent = indent
+        self.on_load = on_load
+        self.json_default = json_default
+        self._lock = RWLock()
+        self._data = None
+        self._stamp = None
+        # Digest of the text on disk, to tell whether update() changed anything
+        self._digest = None
+
+    def _dumps(self) -> str:
+        return json.dumps(self._data, ensure_ascii=False, indent=self.indent, default=self.json_default)
+
+    def _fresh(self) -> bool:
+        return self._data is not None and file_stamp(self.path) == self._stamp
+
+    def _load(self):
+        stamp = file_stamp(self.path)
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                text = file.read()
+            data = json.loads(text)
+        except FileNotFoundError:
+            text = None
+            data = {}
+        self._data = self.on_load(data) if self.on_load else data
+        self._stamp = stamp
+        self._digest = hashlib.sha1(text.encode("utf-8")).digest() if text is not None else None
+
+    def read(self):
+        """The current document, never changed once returned. Changes must go through update()."""
+        if self._lock.held():
+            return self._data
+        with self._lock.read():
+            if self._fresh():
+                return self._data
+        with self._lock.write():
+            if not self._fresh():
+                with file_lock(self.path, exclusive=False):
+                    self._load()
+            return self._data
+
+    @contextmanager
+    def reading(self):
+        """The current document, kept from changing in this process until the block exits."""
+        self.read()
+        with self._lock.read():
+            yield self._data
+
+    @contextmanager
+    def update(self):
+        """A copy of the current document to change in place, written back when the block exits if it changed."""
+        if self._lock.owned():
+            yield self._data
+            return
+        with self._lock.write(), file_lock(self.path):
+            if not self._fresh():
+                self._load()
+            # Other threads may still be reading the current document
+            previous = self._data
+            self._data = copy.deepcopy(previous)
+            try:
+                yield self._data
+                text = self._dumps()
+                digest = hashlib.sha1(text.encode("utf-8")).digest()
+                # Nothing changed, e.g. the block returned early, keep the file as it is
+                if digest == self._digest:
+                    self._data = previous
+                    return
+                atomic_write(self.path, text)
+            except BaseException:
+                # Nothing was written, drop the half changed copy
+                self._data = previous
+                raise
+            self._stamp = file_stamp(self.path)
+            self._digest = digest
+
+    def record(self, path, value):
+        """Nothing to journal, update() writes the whole document."""
+
+    def record_items(self, path, added=(), removed=()):
+        """Nothing to journal, update() writes the whole document."""
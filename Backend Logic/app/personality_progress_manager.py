@@ -1,58 +1,85 @@
-import json
-import os
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import Config
+from .persistence import JsonFile
+from .progress_store import ProgressStore
+from .solved_ids import add_solved
 
 class PersonalityProgressManager:
-    def __init__(self, progress_file: str = "personality_progress.json"):
+    def __init__(self, progress_file: str = "personality_progress.json",
+                 legacy_row_ids: Optional[Callable[[str, List[Dict]], List[int]]] = None):
         self.progress_file = progress_file
-        self._load_progress()
-
-    def _load_progress(self):
-        if os.path.exists(self.progress_file):
-            with open(self.progress_file, 'r', encoding='utf-8') as f:
-                self.progress_data = json.load(f)
+        # Maps a stage's old solved_personalities list to dataset row ids, used once to migrate it
+        self.legacy_row_ids = legacy_row_ids
+        # Journal each changed stage and snapshot in the background instead of rewriting the file
+        if Config.PROGRESS_WRITE_BEHIND:
+            self.store = ProgressStore(self.progress_file)
         else:
-            self.progress_data = {}
-            self._save_progress()
+            self.store = JsonFile(self.progress_file)
+        self._migrate_legacy()
 
-    def _save_progress(self):
-        with open(self.progress_file, 'w', encoding='utf-8') as f:
-            json.dump(self.progress_data, f, ensure_ascii=False, indent=4)
+    @property
+    def progress_data(self) -> dict:
+        """The progress of every user, as last written by any worker process."""
+        return self.store.read()
 
-    def get_solved_questions(self, email: str, educational_stage: str) -> List[Dict]:
-        return self.progress_data.get(email, {}).get(educational_stage, {}).get("solved_personalities", [])
+    def _legacy_stages(self) -> List[Tuple[str, str]]:
+        return [
+            (email, educational_stage)
+            for email, user_data in self.progress_data.items()
+            for educational_stage, stage_data in user_data.items()
+            if "solved_personalities" in stage_data
+        ]
 
-    def update_progress(self, email: str, educational_stage: str, personality_id: int, data: Dict) -> Dict:
-        if email not in self.progress_data:
-            self.progress_data[email] = {}
-            
-        if educational_stage not in self.progress_data[email]:
-            self.progress_data[email][educational_stage] = {
-                "solved_personalities": [],
-                "total_solved": 0,
-                "total_attempts": 0,
-                "correct_matches": 0
-            }
+    def _migrate_legacy(self):
+        """Replace the name and description dicts stages used to store with sorted dataset row ids."""
+        if self.legacy_row_ids is None or not self._legacy_stages():
+            return
+        with self.store.update():
+            for email, educational_stage in self._legacy_stages():
+                stage_data = self.progress_data[email][educational_stage]
+                solved_ids = stage_data.setdefault("solved_ids", [])
+                add_solved(solved_ids, self.legacy_row_ids(educational_stage, stage_data.pop("solved_personalities")))
+                self._save_progress(email, educational_stage)
+
+    def _save_progress(self, *path):
+        """Persist the subtree at path, e.g. (email, stage). Call inside self.store.update()."""
+        node = self.progress_data
+        for key in path:
+            node = node[key]
+        self.store.record(path, node)
+
+    def get_solved_ids(self, email: str, educational_stage: str) -> List[int]:
+        """Sorted personality ids of the personalities solved in a stage."""
+        with self.store.reading():
+            return list(self.progress_data.get(email, {}).get(educational_stage, {}).get("solved_ids", []))
+
+    def update_progress(self, email: str, educational_stage: str, personality_id: int) -> Dict:
+        return self.update_progress_batch(email, educational_stage, [personality_id])
+
+    def update_progress_batch(self, email: str, educational_stage: str, personality_ids: List[int]) -> Dict:
+        """Record every correctly matched personality of a submission with a single save."""
+        with self.store.update():
+            if email not in self.progress_data:
+                self.progress_data[email] = {}
             
-        stage_data = self.progress_data[email][educational_stage]
-        
-        personality_data = {
-            "Personality Name": data['name'],
-            "Description": data['description'],
-            "image_link": data['image_link']
-        }
-        
-        if not any(p["Personality Name"] == data['name'] for p in stage_data["solved_personalities"]):
-            stage_data["solved_personalities"].append(personality_data)
-            stage_data["total_solved"] += 1
-        
-        stage_data["total_attempts"] += 1
-        stage_data["correct_matches"] += 1
+            if educational_stage not in self.progress_data[email]:
+                self.progress_data[email][educational_stage] = {
+                    "solved_ids": [],
+                    "total_solved": 0,
+                    "total_attempts": 0,
+                    "correct_matches": 0
+                }
             
-        self._save_progress()
-        return {
-            "total_solved": stage_data["total_solved"],
-            "total_attempts": stage_data["total_attempts"],
-            "correct_matches": stage_data["correct_matches"],
-            "personalities": stage_data["solved_personalities"]
-        }
+            stage_data = self.progress_data[email][educational_stage]
+            stage_data["total_solved"] += add_solved(stage_data.setdefault("solved_ids", []), personality_ids)
+            stage_data["total_attempts"] += len(personality_ids)
+            stage_data["correct_matches"] += len(personality_ids)
+
+            self._save_progress(email, educational_stage)
+            return {
+                "total_solved": stage_data["total_solved"],
+                "total_attempts": stage_data["total_attempts"],
+                "correct_matches": stage_data["correct_matches"],
+                "solved_ids": list(stage_data["solved_ids"])
+            }
@@ -3,39 +3,71 @@ import numpy as np
 from typing import List, Dict
 import random
 from .config import Config
+from .solved_ids import unsolved
 
 class PersonalityQuizManager:
     def __init__(self):
 
         self.data = pd.read_pickle(Config.PERSONALITY_FILE)
+        # A personality can have several rows in a stage, all of them count as solved together,
+        # so solved personalities are stored as the row id of their first row
+        rows = pd.Series(self.data.index, index=self.data.index)
+        self.personality_ids = rows.groupby(
+            [self.data['Educational stage'], self.data['Personality Name']]).transform('min')
+        self.stage_rows = {
+            stage: stage_index.to_numpy(dtype=np.int64)
+            for stage, stage_index in self.data.groupby('Educational stage', sort=False).groups.items()
+        }
+        self.stage_personality_ids = {
+            stage: self.personality_ids.loc[stage_rows].to_numpy(dtype=np.int64)
+            for stage, stage_rows in self.stage_rows.items()
+        }
+
+    def is_stage_row(self, educational_stage: str, row_id) -> bool:
+        """Whether row_id is a row of the stage, as the ids generate_quiz hands out are."""
+        rows = self.stage_rows.get(educational_stage)
+        if rows is None or isinstance(row_id, bool) or not isinstance(row_id, (int, np.integer)):
+            return False
+        return bool((rows == row_id).any())
 
-    def generate_quiz(self, educational_stage: str, solved_questions: List[Dict], num_questions: int = 5) -> Dict:
+    def personality_id(self, row_id: int) -> int:
+        """The id a personality is stored under once solved, for any of its rows."""
+        return int(self.personality_ids.loc[row_id])
+
+    def legacy_row_ids(self, educational_stage: str, solved_personalities: List[Dict]) -> List[int]:
+        """Personality ids of personalities solved the old way, stored by name and description."""
         filtered_data = self.data[self.data['Educational stage'] == educational_stage]
-        
-        # Extract solved personality names
-        solved_personality_names = [solved['Personality Name'] for solved in solved_questions]
-        
+        names = {solved['Personality Name'] for solved in solved_personalities}
+        matched = filtered_data.index[filtered_data['Personality Name'].isin(names)]
+        return sorted({int(idx) for idx in self.personality_ids.loc[matched]})
+
+    def solved_personalities(self, solved_ids: List[int]) -> List[Dict]:
+        rows = self.data.loc[solved_ids]
+        return [
+            {"Personality Name": name, "Description": content, "image_link": image_link}
+            for name, content, image_link in zip(rows['Personality Name'], rows['Content'], rows['image_link'])
+        ]
+
+    def generate_quiz(self, educational_stage: str, solved_ids: List[int], num_questions: int = 5) -> Dict:
+        if educational_stage not in self.stage_rows:
+            return {'personalities': [], 'descriptions': []}
+        available = unsolved(
+            self.stage_rows[educational_stage], solved_ids, self.stage_personality_ids[educational_stage])
+
         personalities = []
         descriptions = []
-        counter = 0
-        
-        while len(personalities) < num_questions and counter < len(filtered_data):
-            row = filtered_data.iloc[counter]
-            personality_name = row['Personality Name']
-            
-            if personality_name not in solved_personality_names:
-                personalities.append({
-                    'id': counter,
-                    'name': personality_name,
-                    'image_link': row['image_link']
-                })
-                
-                descriptions.append({
-                    'id': counter,
-                    'text': row['Content']
-                })
-                
-            counter += 1
+        for idx in available[:num_questions].tolist():
+            row = self.data.loc[idx]
+            personalities.append({
+                'id': idx,
+                'name': row['Personality Name'],
+                'image_link': row['image_link']
+            })
+
+            descriptions.append({
+                'id': idx,
+                'text': row['Content']
+            })
         
         random.shuffle(descriptions)
         
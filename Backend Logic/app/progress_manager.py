@@ -1,40 +1,104 @@
 import json
 import os
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
 import logging
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from .answered_embeddings import AnsweredEmbeddings
+from .config import Config
+from .embedding_codec import decode_embedding
+from .persistence import JsonFile
+from .progress_store import ProgressStore
+from .question_set import QuestionSet, question_hash, to_json
 
 class ProgressManager:
-    def __init__(self, progress_file: str = "progress.json"):
+    def __init__(self, progress_file: str = "progress.json", encoder: Optional[Callable] = None,
+                 embeddings_file: str = None):
         self.progress_file = os.path.abspath(progress_file)
+        # Embeds a list of questions, answered questions are stored with their embedding
+        # so quiz generation does not re-encode them
+        self.encoder = encoder
+        self.embeddings = AnsweredEmbeddings(embeddings_file)
         self.MAX_LEVELS = 3
         self.MAX_HISTORY = 10
+        # Journal each changed level and snapshot in the background instead of rewriting the file
+        if Config.PROGRESS_WRITE_BEHIND:
+            self.store = ProgressStore(self.progress_file, on_load=self._index)
+        else:
+            self.store = JsonFile(self.progress_file, on_load=lambda data: self._index([], data), json_default=to_json)
         logging.info(f"Initializing ProgressManager with file: {self.progress_file}")
         self._load_progress()
 
+    @property
+    def progress_data(self) -> dict:
+        """The progress of every user, as last written by any worker process."""
+        return self.store.read()
+
     def _load_progress(self):
         try:
-            if os.path.exists(self.progress_file):
-                with open(self.progress_file, 'r', encoding='utf-8') as f:
-                    self.progress_data = json.load(f)
-                    logging.info(f"Successfully loaded progress data with {len(self.progress_data)} users")
-            else:
-                logging.warning(f"Progress file not found at {self.progress_file}, creating new file")
-                self.progress_data = {}
-                self._save_progress()
+            logging.info(f"Successfully loaded progress data with {len(self.progress_data)} users")
         except Exception as e:
             logging.error(f"Error loading progress data: {str(e)}")
-            self.progress_data = {}
-    
-    def _save_progress(self):
-        try:
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(self.progress_file), exist_ok=True)
-            
-            with open(self.progress_file, 'w', encoding='utf-8') as f:
-                json.dump(self.progress_data, f, ensure_ascii=False, indent=4)
-                logging.info("Successfully saved progress data")
-        except Exception as e:
-            logging.error(f"Error saving progress data: {str(e)}")
+
+    def _index_field(self, key: str, value):
+        """The in-memory form of one stored field of a level."""
+        if key in ("answered_questions", "incorrect_questions"):
+            return QuestionSet(value)
+        if key == "quiz_history":
+            return deque(value, maxlen=self.MAX_HISTORY)
+        return value
+
+    def _index_level(self, level_data: dict) -> dict:
+        """Turn a level's stored lists into their in-memory forms, in place."""
+        for key in ("answered_questions", "incorrect_questions", "quiz_history"):
+            level_data[key] = self._index_field(key, level_data.get(key, []))
+        return level_data
+
+    def _index(self, path: List[str], value):
+        """Give every level in a loaded subtree its in-memory forms.
+
+        Answered and incorrect questions are hash sets in memory and quiz_history
+        a bounded deque. Both are written back out as the plain lists the file
+        has always held. Embeddings that older versions kept in the level are
+        moved to self.embeddings.
+        """
+        if len(path) > 3:  # a single field of a level, see _save_level_changes
+            return self._index_field(path[3], value) if len(path) == 4 else value
+        nodes = [(list(path), value)]
+        for _ in range(3 - len(path)):  # levels sit under email, stage
+            nodes = [(node_path + [key], child) for node_path, node in nodes for key, child in node.items()]
+        for (email, educational_stage, level), level_data in nodes:
+            self._index_level(level_data)
+            legacy = level_data.pop("answered_embeddings", None)
+            if legacy:
+                self.embeddings.put(email, educational_stage, level, legacy.keys(),
+                                    [decode_embedding(e) for e in legacy.values()], replace=False)
+        return value
+
+    def _save_progress(self, *path):
+        """Persist the subtree at path, e.g. (email, stage, level). Call inside self.store.update()."""
+        node = self.progress_data
+        for key in path:
+            node = node[key]
+        self.store.record(path, node)
+
+    def _save_level_changes(self, email: str, educational_stage: str, level: str, answered: List[str],
+                            incorrect_added: List[str], incorrect_removed: List[str]):
+        """Persist what a submission changed in an existing level. Call inside self.store.update().
+
+        Journals the counters and quiz history, which are bounded, and only the
+        questions added to or removed from the question sets, so the record size
+        follows the submission rather than the student's history.
+        """
+        path = (email, educational_stage, level)
+        level_data = self.progress_data[email][educational_stage][level]
+        for key in ("progress", "total_correct", "total_incorrect", "total_questions_seen", "quiz_history"):
+            self.store.record(path + (key,), level_data[key])
+        self.store.record_items(path + ("answered_questions",), added=answered)
+        self.store.record_items(path + ("incorrect_questions",), added=incorrect_added, removed=incorrect_removed)
 
     def get_user_progress(self, email: str, educational_stage: str, level: int) -> dict:
         if email not in self.progress_data:
@@ -49,6 +113,10 @@ class ProgressManager:
 
     def get_stage_progress(self, email: str, educational_stage: str) -> dict:
         """Get progress for all levels in a given educational stage"""
+        with self.store.reading():
+            return self._stage_progress(email, educational_stage)
+
+    def _stage_progress(self, email: str, educational_stage: str) -> dict:
         try:
             progress_by_level = {str(i): {"progress": 0, "mastery": 0} for i in range(1, self.MAX_LEVELS + 1)}
             
@@ -75,103 +143,142 @@ class ProgressManager:
 
     def get_incorrect_questions(self, email: str, educational_stage: str, level: int) -> List[str]:
         """Get list of incorrectly answered questions for retaking."""
-        if email not in self.progress_data:
-            return []
-            
-        user_data = self.progress_data[email]
-        if educational_stage not in user_data or str(level) not in user_data[educational_stage]:
-            return []
+        with self.store.reading():
+            if email not in self.progress_data:
+                return []
+
+            user_data = self.progress_data[email]
+            if educational_stage not in user_data or str(level) not in user_data[educational_stage]:
+                return []
+
+            level_data = user_data[educational_stage][str(level)]
+            return list(level_data.get("incorrect_questions", []))
+
+    @staticmethod
+    def _level_progress(level_data: dict) -> float:
+        total_questions = level_data.get('total_questions_seen', 0)
+        correct_answers = level_data.get('total_correct', 0)
+        
+        if total_questions == 0:
+            return 0
             
-        level_data = user_data[educational_stage][str(level)]
-        return level_data.get("incorrect_questions", [])
+        # Calculate progress based on both accuracy and number of questions
+        base_progress = correct_answers * 10 
+        return min(100, base_progress)
 
     def calculate_level_progress(self, email: str, educational_stage: str, level: int) -> float:
         """Calculate the overall progress for a specific level."""
         try:
-            level_data = self.get_user_progress(email, educational_stage, level)
-            total_questions = level_data.get('total_questions_seen', 0)
-            correct_answers = level_data.get('total_correct', 0)
-            
-            if total_questions == 0:
-                return 0
-                
-            # Calculate progress based on both accuracy and number of questions
-            base_progress = correct_answers * 10 
-            return min(100, base_progress)
+            return self._level_progress(self.get_user_progress(email, educational_stage, level))
         except Exception as e:
             logging.error(f"Error calculating level progress: {str(e)}")
             return 0
 
     def update_progress(self, email: str, educational_stage: str, level: int, question: str, is_correct: bool):
-        if email not in self.progress_data:
-            self.progress_data[email] = {}
+        return self.update_progress_batch(email, educational_stage, level, [(question, is_correct)])["results"][0]
 
-        if educational_stage not in self.progress_data[email]:
-            self.progress_data[email][educational_stage] = {}
+    def update_progress_batch(self, email: str, educational_stage: str, level: int,
+                              answers: List[Tuple[str, bool]]) -> dict:
+        """Apply all (question, is_correct) answers of a submission with a single save.
 
-        if str(level) not in self.progress_data[email][educational_stage]:
-            self.progress_data[email][educational_stage][str(level)] = {
-                "progress": 0,
-                "answered_questions": [],
-                "incorrect_questions": [],
-                "total_correct": 0,
-                "total_incorrect": 0
-            }
+        Returns the progress after each answer under "results", and the level
+        progress and mastery stats after the whole batch.
+        """
+        # One encoder call for every question that may be newly answered, outside the lock
+        embeddings = {}
+        if self.encoder is not None:
+            with self.store.reading():
+                answered = self.get_user_progress(email, educational_stage, level).get("answered_questions", [])
+                candidates = list(dict.fromkeys(q for q, is_correct in answers if is_correct and q not in answered))
+            if candidates:
+                embeddings = dict(zip(candidates, self.encoder(candidates)))
 
-        level_data = self.progress_data[email][educational_stage][str(level)]
-        
-        # Initialize incorrect_questions if it doesn't exist
-        if "incorrect_questions" not in level_data:
-            level_data["incorrect_questions"] = []
-
-        # Handle the question result
-        if is_correct:
-            if question in level_data["incorrect_questions"]:
-                level_data["incorrect_questions"].remove(question)
-                level_data["total_incorrect"] -= 1
-            if question not in level_data["answered_questions"]:
-                level_data["answered_questions"].append(question)
-                level_data["total_correct"] += 1
-        else:
-            if question not in level_data["incorrect_questions"]:
-                level_data["incorrect_questions"].append(question)
-                level_data["total_incorrect"] += 1
-
-        # Update total questions seen
-        if 'total_questions_seen' not in level_data:
-            level_data['total_questions_seen'] = 0
-        level_data['total_questions_seen'] += 1
-
-        # Calculate the new progress
-        new_progress = self.calculate_level_progress(email, educational_stage, level)
-        level_data['progress'] = new_progress
-
-        # Add timestamp and quiz history
-        from datetime import datetime
-        quiz_entry = {
-            "question": question,
-            "correct": is_correct,
-            "timestamp": datetime.now().isoformat(),
-            "level": level
-        }
+        with self.store.update():
+            if email not in self.progress_data:
+                self.progress_data[email] = {}
+
+            if educational_stage not in self.progress_data[email]:
+                self.progress_data[email][educational_stage] = {}
+
+            new_level = str(level) not in self.progress_data[email][educational_stage]
+            if new_level:
+                self.progress_data[email][educational_stage][str(level)] = self._index_level({
+                    "progress": 0,
+                    "total_correct": 0,
+                    "total_incorrect": 0
+                })
+
+            level_data = self.progress_data[email][educational_stage][str(level)]
         
-        if "quiz_history" not in level_data:
-            level_data["quiz_history"] = []
-            
-        level_data["quiz_history"].insert(0, quiz_entry)
-        level_data["quiz_history"] = level_data["quiz_history"][:self.MAX_HISTORY]
+            if 'total_questions_seen' not in level_data:
+                level_data['total_questions_seen'] = 0
 
-        self._save_progress()
+            timestamp = datetime.now().isoformat()
+            newly_answered = []
+            # Whether each question touched here was incorrect before the submission
+            was_incorrect = {}
+            results = []
+            for question, is_correct in answers:
+                was_incorrect.setdefault(question, question in level_data["incorrect_questions"])
+                # Handle the question result
+                if is_correct:
+                    if level_data["incorrect_questions"].discard(question):
+                        level_data["total_incorrect"] -= 1
+                    if level_data["answered_questions"].add(question):
+                        level_data["total_correct"] += 1
+                        newly_answered.append(question)
+                else:
+                    if level_data["incorrect_questions"].add(question):
+                        level_data["total_incorrect"] += 1
+
+                # Update total questions seen
+                level_data['total_questions_seen'] += 1
+
+                # Add timestamp and quiz history
+                level_data["quiz_history"].appendleft({
+                    "question": question,
+                    "correct": is_correct,
+                    "timestamp": timestamp,
+                    "level": level
+                })
+
+                results.append({
+                    "progress": self._level_progress(level_data),
+                    "total_correct": level_data["total_correct"],
+                    "total_incorrect": level_data["total_incorrect"],
+                    "incorrect_questions": list(level_data["incorrect_questions"]),
+                    "total_questions_seen": level_data["total_questions_seen"]
+                })
+
+            # Calculate the new progress
+            new_progress = self._level_progress(level_data)
+            level_data['progress'] = new_progress
+
+            if new_level:
+                self._save_progress(email, educational_stage, str(level))
+            else:
+                incorrect = level_data["incorrect_questions"]
+                self._save_level_changes(
+                    email, educational_stage, str(level), newly_answered,
+                    [q for q, before in was_incorrect.items() if not before and q in incorrect],
+                    [q for q, before in was_incorrect.items() if before and q not in incorrect])
+            mastery_stats = self._mastery_stats(level_data)
+
+        # Embeddings computed before taking the lock, questions missed here are backfilled later
+        stored = [q for q in newly_answered if q in embeddings]
+        self.embeddings.put(email, educational_stage, level, stored, [embeddings[q] for q in stored])
         return {
-            "progress": new_progress,
-            "total_correct": level_data["total_correct"],
-            "total_incorrect": level_data["total_incorrect"],
-            "incorrect_questions": level_data["incorrect_questions"],
-            "total_questions_seen": level_data["total_questions_seen"]
+            "results": results,
+            "level_progress": new_progress,
+            "mastery_stats": mastery_stats
         }
 
     def get_user_stats(self, email: str, educational_stage: str = None) -> dict:
         """Get detailed statistics for a user"""
+        with self.store.reading():
+            return self._user_stats(email, educational_stage)
+
+    def _user_stats(self, email: str, educational_stage: str = None) -> dict:
         stats = {
             "total_questions_answered": 0,
             "total_correct": 0,
@@ -226,8 +333,31 @@ class ProgressManager:
         return stats
 
     def get_answered_questions(self, email: str, educational_stage: str, level: int) -> List[str]:
-        level_data = self.get_user_progress(email, educational_stage, level)
-        return level_data.get("answered_questions", [])
+        with self.store.reading():
+            level_data = self.get_user_progress(email, educational_stage, level)
+            return list(level_data.get("answered_questions", []))
+
+    def get_answered_embeddings(self, email: str, educational_stage: str, level: int) -> Optional[np.ndarray]:
+        """Embeddings of the answered questions as one matrix, in answered_questions order.
+
+        Questions answered before embeddings were stored are encoded once here
+        and saved. Returns None when there is no encoder to fill the gaps.
+        """
+        questions = self.get_answered_questions(email, educational_stage, level)
+        if not questions:
+            return np.zeros((0, 0), dtype='float32')
+
+        stored = self.embeddings.get(email, educational_stage, level)
+        missing = [q for q in questions if question_hash(q) not in stored]
+        if missing:
+            if self.encoder is None:
+                return None
+            encoded = self.encoder(missing)
+            self.embeddings.put(email, educational_stage, level, missing, encoded)
+            stored.update((question_hash(q), np.asarray(e, dtype='float16').astype('float32'))
+                          for q, e in zip(missing, encoded))
+
+        return np.vstack([stored[question_hash(q)] for q in questions])
 
     def get_mastery_stats(self, email: str, educational_stage: str, level: int) -> dict:
         """Get mastery statistics for a specific level"""
@@ -236,8 +366,10 @@ class ProgressManager:
 
         user_data = self.progress_data[email]
         stage_data = user_data.get(educational_stage, {})
-        level_data = stage_data.get(str(level), {})
+        return self._mastery_stats(stage_data.get(str(level), {}))
 
+    @staticmethod
+    def _mastery_stats(level_data: dict) -> dict:
         total_correct = level_data.get('total_correct', 0)
         total_questions = level_data.get('total_questions_seen', 0)
         
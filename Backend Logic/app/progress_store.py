@@ -0,0 +1,276 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+from .config import Config
+from .persistence import RWLock, atomic_write, file_lock
+from .question_set import to_json
+
+
+class ProgressStore:
+    """Write-behind persistence for the progress managers' nested dicts.
+
+    The JSON file is a snapshot. Every mutation appends one record to a
+    journal next to it: the path of the subtree that changed (e.g. [email,
+    stage, level, "total_correct"]) and its new value, or the path of a set
+    and the items added to and removed from it. Records are flushed immediately and
+    fsync'd in groups, at most fsync_batch records or fsync_interval seconds
+    apart. A background thread compacts the journal into a fresh snapshot
+    every snapshot_interval seconds. On load the snapshot is read and the
+    journal replayed over it. Records set absolute values or add and remove
+    set items, so replaying one twice is harmless.
+
+    Worker processes share the files. Changes are made inside update(), which
+    holds an exclusive file lock and first replays the records other processes
+    appended, read() replays them too. Compaction replaces the journal with a
+    new empty file, other processes see its new inode and reload the snapshot.
+    on_load(path, value) converts the snapshot and every replayed value, it
+    must turn the values items are recorded for into objects with add() and
+    discard().
+    """
+
+    def __init__(self, snapshot_file: str, fsync_interval: float = None, fsync_batch: int = None,
+                 snapshot_interval: float = None, on_load: Optional[Callable] = None):
+        self.snapshot_file = os.path.abspath(snapshot_file)
+        self.journal_file = self.snapshot_file + ".journal"
+        # Left behind by a compaction that older versions interrupted
+        self.rotated_file = self.journal_file + ".old"
+        self.fsync_interval = fsync_interval or Config.PROGRESS_FSYNC_INTERVAL
+        self.fsync_batch = fsync_batch or Config.PROGRESS_FSYNC_BATCH
+        self.snapshot_interval = snapshot_interval or Config.PROGRESS_SNAPSHOT_INTERVAL
+        self.on_load = on_load
+
+        self.data = None
+        self._lock = RWLock()
+        self._journal = None
+        self._journal_id = None
+        self._offset = 0
+        self._unsynced = 0
+        self._last_snapshot = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _dumps(value) -> str:
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=to_json)
+
+    @staticmethod
+    def _apply(data: dict, path: List[str], value):
+        if not path:
+            return value
+        node = data
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = value
+        return data
+
+    @staticmethod
+    def _apply_items(data: dict, path: List[str], added: List, removed: List):
+        node = data
+        for key in path:
+            node = node[key]
+        for item in removed:
+            node.discard(item)
+        for item in added:
+            node.add(item)
+
+    def _replay(self, journal_file: str, offset: int = 0) -> Tuple[int, int]:
+        """Apply the records from offset on, returning how many and the offset after the last one."""
+        try:
+            with open(journal_file, 'rb') as f:
+                f.seek(offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return 0, offset
+
+        count = 0
+        for line in chunk.splitlines(keepends=True):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("incomplete record")
+                record = json.loads(line)
+            except ValueError:
+                # A torn last line from a crash mid-append, everything before it is intact
+                logging.warning(f"Skipping unreadable journal record in {journal_file}")
+                break
+            if "v" in record:
+                value = self.on_load(record["p"], record["v"]) if self.on_load else record["v"]
+                self.data = self._apply(self.data, record["p"], value)
+            else:
+                try:
+                    self._apply_items(self.data, record["p"], record.get("a", []), record.get("d", []))
+                except KeyError:
+                    logging.warning(f"Skipping journal record for missing set {record['p']} in {journal_file}")
+            offset += len(line)
+            count += 1
+        return count, offset
+
+    def _journal_stat(self):
+        try:
+            stat = os.stat(self.journal_file)
+        except FileNotFoundError:
+            return None, 0
+        return (stat.st_dev, stat.st_ino), stat.st_size
+
+    def _fresh(self) -> bool:
+        return self.data is not None and self._journal_stat() == (self._journal_id, self._offset)
+
+    def _open_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_file, 'ab')
+        stat = os.fstat(self._journal.fileno())
+        self._journal_id = (stat.st_dev, stat.st_ino)
+
+    def _reload(self) -> int:
+        """Read the snapshot and replay both journals. Needs the write lock and a file lock."""
+        data = {}
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        self.data = self.on_load([], data) if self.on_load else data
+
+        rotated, _ = self._replay(self.rotated_file)
+        self._open_journal()
+        pending, self._offset = self._replay(self.journal_file)
+        return rotated + pending
+
+    def _drop_torn(self):
+        """Cut a torn record off the journal so new ones do not end up behind it. Needs the exclusive lock."""
+        if self._journal_stat()[1] > self._offset:
+            self._journal.truncate(self._offset)
+
+    def _catch_up(self):
+        """Replay what other processes appended, or reload after one of them compacted."""
+        journal_id, size = self._journal_stat()
+        if journal_id != self._journal_id:
+            self._reload()
+        elif size > self._offset:
+            _, self._offset = self._replay(self.journal_file, self._offset)
+
+    def load(self) -> dict:
+        """Read the snapshot, replay the journal and start the background writer."""
+        with self._lock.write():
+            if self.data is not None:
+                return self.data
+            with file_lock(self.snapshot_file):
+                replayed = self._reload()
+                self._drop_torn()
+                if os.path.exists(self.rotated_file):
+                    self._compact()
+            logging.info(f"Loaded {self.snapshot_file} and replayed {replayed} journal records")
+
+        self._thread = threading.Thread(target=self._run, name="progress-store", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self.data
+
+    def read(self) -> dict:
+        """The current data. Changes must go through update(), which changes it in place,
+        so iterate it inside reading() when other threads may be updating it."""
+        if self.data is None:
+            self.load()
+        if self._lock.held():
+            return self.data
+        with self._lock.read():
+            if self._fresh():
+                return self.data
+        with self._lock.write():
+            if not self._fresh():
+                with file_lock(self.snapshot_file, exclusive=False):
+                    self._catch_up()
+            return self.data
+
+    @contextmanager
+    def reading(self):
+        """The current data, kept from changing in this process until the block exits."""
+        self.read()
+        with self._lock.read():
+            yield self.data
+
+    @contextmanager
+    def update(self):
+        """The current data to change in place, record() every changed subtree before the block exits."""
+        if self.data is None:
+            self.load()
+        if self._lock.owned():
+            yield self.data
+            return
+        with self._lock.write(), file_lock(self.snapshot_file):
+            self._catch_up()
+            self._drop_torn()
+            try:
+                yield self.data
+            except BaseException:
+                # The data may hold changes that were never journaled, reload it next time
+                self._journal_id = None
+                raise
+
+    def record(self, path: List[str], value):
+        """Journal that the subtree at path now holds value. Call inside update()."""
+        self._append({"p": list(path), "v": value})
+
+    def record_items(self, path: List[str], added=(), removed=()):
+        """Journal the items added to and removed from the set at path. Call inside update()."""
+        if added or removed:
+            self._append({"p": list(path), "a": list(added), "d": list(removed)})
+
+    def _append(self, record: dict):
+        line = (self._dumps(record) + "\n").encode('utf-8')
+        with self._lock.write():
+            self._journal.write(line)
+            self._journal.flush()
+            self._offset += len(line)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_batch:
+                self._sync()
+
+    def _sync(self):
+        if self._unsynced:
+            os.fsync(self._journal.fileno())
+            self._unsynced = 0
+
+    def compact(self):
+        """Write the current data as the snapshot and start an empty journal."""
+        with self._lock.write(), file_lock(self.snapshot_file):
+            self._catch_up()
+            if self._offset or os.path.exists(self.rotated_file):
+                self._compact()
+            self._last_snapshot = time.monotonic()
+
+    def _compact(self):
+        self._sync()
+        atomic_write(self.snapshot_file, self._dumps(self.data))
+        # A new file rather than a truncated one, so other processes notice the compaction
+        atomic_write(self.journal_file, "")
+        if os.path.exists(self.rotated_file):
+            os.remove(self.rotated_file)
+        self._open_journal()
+        self._offset = 0
+
+    def _run(self):
+        while not self._stop.wait(self.fsync_interval):
+            try:
+                with self._lock.write():
+                    self._sync()
+                if time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+                    self.compact()
+            except Exception as e:
+                logging.error(f"Error persisting {self.snapshot_file}: {str(e)}")
+
+    def close(self):
+        """Stop the background writer and leave a fresh snapshot behind."""
+        if self._journal is None or self._journal.closed:
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.compact()
+        with self._lock.write():
+            self._sync()
+            self._journal.close()
@@ -0,0 +1,173 @@
+import copy
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .config import Config
+
+
+def normalize(vectors) -> np.ndarray:
+    vectors = np.array(vectors, dtype='float32', ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class QuestionBank:
+    """Persistent bank of generated quiz questions shared by all users.
+
+    Every question is stored in a SQLite file with its answers, source stage,
+    level and topic, and its embedding as float16. Embeddings are kept in
+    memory as one normalized matrix per (stage, level), so near-duplicates
+    are dropped on insert and unseen questions are selected with one matrix
+    product against the user's answered-question embeddings.
+
+    Other processes (gunicorn workers, prefill_question_bank.py) write the
+    same file. Rows are only ever appended, so the blocks are caught up by
+    reading the rows past the last id loaded, whenever PRAGMA data_version
+    shows another connection committed, and always inside the write
+    transaction of add() so duplicates are checked against every worker's
+    questions.
+    """
+
+    def __init__(self, path: str = None, dedupe_threshold: float = None, seen_threshold: float = None):
+        self.path = path or Config.QUESTION_BANK_FILE
+        self.dedupe_threshold = dedupe_threshold or Config.QUESTION_BANK_DEDUPE_THRESHOLD
+        self.seen_threshold = seen_threshold or Config.QUESTION_BANK_SEEN_THRESHOLD
+        self._lock = threading.Lock()
+        self._blocks: Dict[tuple, dict] = {}
+        self._last_id = 0
+        self._data_version = None
+
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            "id INTEGER PRIMARY KEY, educational_stage TEXT NOT NULL, level INTEGER NOT NULL, "
+            "topic TEXT, question TEXT NOT NULL, answers TEXT NOT NULL, embedding BLOB NOT NULL, "
+            "created REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS questions_stage_level ON questions (educational_stage, level)")
+        self._db.commit()
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self, force: bool = False):
+        """Load the rows written since the last refresh, by any process. Needs self._lock."""
+        data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if not force and data_version == self._data_version:
+            return
+        self._data_version = data_version
+
+        rows = self._db.execute(
+            "SELECT id, educational_stage, level, topic, question, answers, embedding FROM questions "
+            "WHERE id > ? ORDER BY id", (self._last_id,))
+        loaded = {}
+        for question_id, stage, level, topic, question, answers, embedding in rows:
+            block = loaded.setdefault((stage, level), {"ids": [], "questions": [], "vectors": []})
+            block["ids"].append(question_id)
+            block["questions"].append({"question": question, "answers": json.loads(answers), "topic": topic})
+            block["vectors"].append(np.frombuffer(embedding, dtype='float16'))
+            self._last_id = question_id
+        for key, new in loaded.items():
+            vectors = normalize(np.vstack(new["vectors"]))
+            block = self._blocks.get(key)
+            if block is None:
+                self._blocks[key] = dict(new, vectors=vectors)
+            else:
+                block["ids"].extend(new["ids"])
+                block["questions"].extend(new["questions"])
+                block["vectors"] = np.vstack([block["vectors"], vectors])
+
+    def add(self, educational_stage: str, level: int, questions: List[Dict], embeddings,
+            topic: Optional[str] = None) -> int:
+        """Insert parsed quiz questions, skipping near-duplicates of the bank and of each other.
+
+        Returns the number of questions inserted.
+        """
+        if not questions:
+            return 0
+        key = (educational_stage, int(level))
+        vectors = normalize(embeddings)
+
+        with self._lock:
+            # Holding the write lock, no other process can insert between the refresh and the commit
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh(force=True)
+                block = self._blocks.get(key)
+                existing = block["vectors"] if block else np.zeros((0, vectors.shape[1]), dtype='float32')
+                kept = []
+                for question, vector in zip(questions, vectors):
+                    if len(existing) and float((existing @ vector).max()) >= self.dedupe_threshold:
+                        continue
+                    kept.append((question, vector))
+                    existing = np.vstack([existing, vector[None, :]])
+
+                ids, stored = [], []
+                now = time.time()
+                for question, vector in kept:
+                    answers = [{"optionLabel": a["optionLabel"], "isCorrect": a["isCorrect"]}
+                               for a in question["answers"]]
+                    cursor = self._db.execute(
+                        "INSERT INTO questions (educational_stage, level, topic, question, answers, embedding, created) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (educational_stage, int(level), topic, question["question"],
+                         json.dumps(answers, ensure_ascii=False), vector.astype('float16').tobytes(), now))
+                    ids.append(cursor.lastrowid)
+                    stored.append({"question": question["question"], "answers": answers, "topic": topic})
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+
+            if not kept:
+                return 0
+            block = block or {"ids": [], "questions": []}
+            block["ids"].extend(ids)
+            block["questions"].extend(stored)
+            block["vectors"] = existing
+            self._blocks[key] = block
+            self._last_id = ids[-1]
+            return len(kept)
+
+    def select(self, educational_stage: str, level: int, answered_embeddings=None,
+               answered_questions: List[str] = None, n: int = 5) -> List[Dict]:
+        """Pick up to n random bank questions the user has not answered or seen something close to.
+
+        Returned questions are copies in quiz format with shuffled answers and no ids.
+        """
+        key = (educational_stage, int(level))
+        with self._lock:
+            self._refresh()
+            block = self._blocks.get(key)
+            if block is None:
+                return []
+
+            candidates = np.random.permutation(len(block["ids"]))
+            if answered_embeddings is not None and len(answered_embeddings):
+                answered = normalize(answered_embeddings)
+                max_similarity = (block["vectors"][candidates] @ answered.T).max(axis=1)
+                candidates = candidates[max_similarity < self.seen_threshold]
+
+            answered_text = {' '.join(q.split()) for q in answered_questions or []}
+            selected = []
+            for i in candidates:
+                question = block["questions"][i]
+                if ' '.join(question["question"].split()) in answered_text:
+                    continue
+                answers = copy.deepcopy(question["answers"])
+                np.random.shuffle(answers)
+                for idx, answer in enumerate(answers):
+                    answer["index"] = idx
+                selected.append({"question": question["question"], "answers": answers})
+                if len(selected) >= n:
+                    break
+            return selected
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refresh()
+            return {f"{stage}/{level}": len(block["ids"]) for (stage, level), block in self._blocks.items()}
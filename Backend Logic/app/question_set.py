@@ -0,0 +1,52 @@
+import hashlib
+from collections import deque
+from typing import Iterable
+
+
+def question_hash(question: str) -> bytes:
+    """Stable key for a question, insensitive to whitespace differences."""
+    return hashlib.blake2b(' '.join(str(question).split()).encode('utf-8'), digest_size=16).digest()
+
+
+class QuestionSet:
+    """Insertion-ordered set of questions keyed by question_hash.
+
+    Membership, add and discard are O(1). Iterating yields the question texts
+    in the order they were added, so it serializes to the same JSON list the
+    progress files always stored.
+    """
+
+    __slots__ = ("_items",)
+
+    def __init__(self, questions: Iterable[str] = ()):
+        self._items = {}
+        for question in questions:
+            self.add(question)
+
+    def __contains__(self, question) -> bool:
+        return question_hash(question) in self._items
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, question: str) -> bool:
+        """Add a question, returning False if it was already present."""
+        key = question_hash(question)
+        if key in self._items:
+            return False
+        self._items[key] = question
+        return True
+
+    def discard(self, question: str) -> bool:
+        """Remove a question, returning False if it was not present."""
+        return self._items.pop(question_hash(question), None) is not None
+
+
+def to_json(value):
+    """json.dump default for QuestionSet and deque values, written as plain lists."""
+    if isinstance(value, (QuestionSet, deque)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -1,18 +1,67 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
+import json
 import numpy as np
 import re
+import threading
+from jsonschema import Draft202012Validator
 from .config import Config
 from .ml_manager import MLManager
 import pandas as pd
 
+# One quiz question as returned by JSON-mode generation: three options, exactly one correct
+QUESTION_SCHEMA = {
+    "type": "object",
+    "required": ["question", "options"],
+    "properties": {
+        "question": {"type": "string", "minLength": 1},
+        "options": {
+            "type": "array",
+            "minItems": 3,
+            "maxItems": 3,
+            "items": {
+                "type": "object",
+                "required": ["text", "correct"],
+                "properties": {
+                    "text": {"type": "string", "minLength": 1},
+                    "correct": {"type": "boolean"}
+                }
+            },
+            "contains": {"properties": {"correct": {"const": True}}},
+            "minContains": 1,
+            "maxContains": 1
+        }
+    }
+}
+QUESTION_VALIDATOR = Draft202012Validator(QUESTION_SCHEMA)
+
+QUIZ_JSON_INSTRUCTIONS = """Give each question 3 possible answers following these rules:
+1. Only 1 answer should be correct
+2. All options must be of similar length and detail level
+3. Wrong answers must be historically plausible but incorrect
+4. Avoid making the correct answer more detailed than others
+5. Each option should be 10-15 words maximum
+
+Respond with a JSON object only, in this format:
+{"questions": [{"question": "<question>", "options": [{"text": "<answer>", "correct": false}, {"text": "<answer>", "correct": false}, {"text": "<answer>", "correct": true}]}]}"""
+
+
+def question_errors(item) -> List[str]:
+    """Schema violations of one generated question, empty when it is valid."""
+    return [error.message for error in QUESTION_VALIDATOR.iter_errors(item)]
+
 class QuizManager:
-    def __init__(self, ml_manager: MLManager):
+    def __init__(self, ml_manager: MLManager, question_bank=None):
         self.ml_manager = ml_manager
+        # Generated questions are added to the bank (QuestionBank) for reuse by other users
+        self.question_bank = question_bank
         self.similarity_threshold = 0.86  # Exact value from quiz1.py
         self.temperatures = {
             'question_generation': 0.7,  # Medium-high for creative but focused questions
             'answer_generation': 0.3     # Lower for more controlled, accurate answers
         }
+        # Normalized content embeddings per (stage, level), see _content_block
+        self._blocks = {}
+        self._blocks_lock = threading.Lock()
 
     def calculate_similarity(self, embedding1, embedding2):
         """Exactly as implemented in quiz1.py"""
@@ -20,8 +69,16 @@ class QuizManager:
         embedding2 = np.array(embedding2)
         return np.dot(embedding1, embedding2.T) / (np.linalg.norm(embedding1) * np.linalg.norm(embedding2))
 
-    def filter_similar_content(self, level, educational_stage, answered_questions_embeddings, max_rows=25):
-        """Exact implementation from quiz1.py"""
+    def _content_block(self, level, educational_stage):
+        """Rows for a stage and level (or the whole stage if the level has none) with their normalized embeddings.
+
+        Blocks are built once per (stage, level) and reused by every quiz.
+        """
+        key = (educational_stage, level)
+        with self._blocks_lock:
+            if key in self._blocks:
+                return self._blocks[key]
+
         data = self.ml_manager.get_data()
         relevant_data = data[
             (data['EducationalStage'] == educational_stage) & 
@@ -30,86 +87,99 @@ class QuizManager:
 
         if relevant_data.empty:
             relevant_data = data[data['EducationalStage'] == educational_stage]
-        
-        if relevant_data.empty:
-            return pd.DataFrame()
-
-        filtered_data = []
-        relevant_data = relevant_data.sample(frac=1).reset_index(drop=True)
-        
-        for _, row in relevant_data.iterrows():
-            context_embedding = np.array(row['Embeddings'])
-            max_similarity = -1
-            
-            for answered_embedding in answered_questions_embeddings:
-                similarity = self.calculate_similarity(context_embedding, answered_embedding)
-                if similarity > max_similarity:
-                    max_similarity = similarity
-
-            if max_similarity < self.similarity_threshold:
-                filtered_data.append(row)
 
-            if len(filtered_data) >= max_rows:
-                break
+        block = None
+        if not relevant_data.empty:
+            embeddings = np.vstack(relevant_data['Embeddings'].to_numpy()).astype('float32')
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            block = (relevant_data.reset_index(drop=True), embeddings / np.where(norms == 0, 1, norms))
 
-        return pd.DataFrame(filtered_data)
+        with self._blocks_lock:
+            self._blocks[key] = block
+        return block
 
-    def generate_quiz(self, educational_stage: str, level: int, answered_questions: List[str], num_questions: int = 5) -> List[Dict]:
-        """Implementation exactly matching quiz1.py's generate_question_without_repeats"""
-        try:
+    def filter_similar_content(self, level, educational_stage, answered_questions_embeddings, max_rows=25):
+        """Up to max_rows random rows whose content is not too similar to any answered question."""
+        block = self._content_block(level, educational_stage)
+        if block is None:
+            return pd.DataFrame()
+        relevant_data, embeddings = block
+
+        order = np.random.permutation(len(relevant_data))
+        if len(answered_questions_embeddings):
+            answered = np.array(answered_questions_embeddings, dtype='float32', ndmin=2)
+            answered /= np.linalg.norm(answered, axis=1, keepdims=True)
+            # Highest cosine of each candidate row against all answered questions in one product
+            max_similarity = (embeddings[order] @ answered.T).max(axis=1)
+            order = order[max_similarity < self.similarity_threshold]
+
+        return relevant_data.iloc[order[:max_rows]]
+
+    def _prepare_generation(self, educational_stage: str, level: int, answered_questions: List[str], num_questions: int,
+                            answered_embeddings=None):
+        """Pick the context for a new quiz and build the question-writing system prompt, None if there is no content."""
+        if answered_embeddings is None:
             answered_embeddings = [
                 self.ml_manager.encode_text(q) for q in answered_questions
             ] if answered_questions else []
 
-            filtered_data = self.filter_similar_content(
-                level, 
-                educational_stage, 
-                answered_embeddings
-            )
+        filtered_data = self.filter_similar_content(
+            level, 
+            educational_stage, 
+            answered_embeddings
+        )
+        
+        if filtered_data.empty:
+            return None
+
+        # Add error handling for Content column
+        contents = []
+        for _, row in filtered_data.iterrows():
+            try:
+                content = row['Content']
+                # Convert float or any other type to string
+                if not isinstance(content, str):
+                    content = str(content)
+                contents.append(content)
+            except Exception as e:
+                print(f"Error processing content: {e}")
+                continue
+        # Skip if no valid contents found
+        if not contents:
+            return None
             
-            if filtered_data.empty:
-                return []
-
-            # Add error handling for Content column
-            contents = []
-            for _, row in filtered_data.iterrows():
-                try:
-                    content = row['Content']
-                    # Convert float or any other type to string
-                    if not isinstance(content, str):
-                        content = str(content)
-                    contents.append(content)
-                except Exception as e:
-                    print(f"Error processing content: {e}")
-                    continue
-            # Skip if no valid contents found
-            if not contents:
-                return []
-                
-            combined_context = "\n".join(contents)
-            # Limit context to 5000 words
-            words = combined_context.split()
-            combined_context = ' '.join(words[:500])
-
-
-            # Enhanced question generation prompt that includes previously correct questions
-            correct_questions_str = "\n".join(f"- {q}" for q in answered_questions) if answered_questions else "None"
-
-            # Enhanced question generation prompt with educational stage complexity
-            stage_complexity = {
-                "PS": "Create very simple questions using basic vocabulary. Focus on direct facts and simple recall.",
-                "JS": "Create clear questions with moderate complexity. Use straightforward historical concepts.",
-                "HSS": "Create challenging questions that test understanding of historical concepts and relationships.",
-                "HSL": "Create sophisticated questions that test analytical and critical thinking skills.",
-                "UNI": "Create advanced questions that test deep historical understanding and interpretation."
-            }
-
-            stage_prefix = educational_stage[:2]
-            complexity_guide = stage_complexity.get(stage_prefix, stage_complexity["JS"])
+        combined_context = "\n".join(contents)
+        # Limit context to 5000 words
+        words = combined_context.split()
+        combined_context = ' '.join(words[:500])
+
+        # Topics of the rows that made it into the context, recorded with banked questions
+        topics, context_words = [], 0
+        if 'Topic' in filtered_data.columns:
+            for topic, content in zip(filtered_data['Topic'], contents):
+                if context_words >= 500:
+                    break
+                context_words += len(content.split())
+                if pd.notnull(topic) and str(topic) not in topics:
+                    topics.append(str(topic))
+
+
+        # Enhanced question generation prompt that includes previously correct questions
+        correct_questions_str = "\n".join(f"- {q}" for q in answered_questions) if answered_questions else "None"
+
+        # Enhanced question generation prompt with educational stage complexity
+        stage_complexity = {
+            "PS": "Create very simple questions using basic vocabulary. Focus on direct facts and simple recall.",
+            "JS": "Create clear questions with moderate complexity. Use straightforward historical concepts.",
+            "HSS": "Create challenging questions that test understanding of historical concepts and relationships.",
+            "HSL": "Create sophisticated questions that test analytical and critical thinking skills.",
+            "UNI": "Create advanced questions that test deep historical understanding and interpretation."
+        }
 
+        stage_prefix = educational_stage[:2]
+        complexity_guide = stage_complexity.get(stage_prefix, stage_complexity["JS"])
 
-            question_messages = [
-                {"role": "system", "content": f"""You are a history teacher creating quiz 
+        question_prompt = f"""You are a history teacher creating quiz 
                 questions in Arabic ONLY.
                 {complexity_guide}
                 Educational level: {educational_stage}
@@ -117,47 +187,37 @@ class QuizManager:
                 Previously correctly answered questions:
                 {correct_questions_str}
 
-                Please generate {num_questions} NEW questions that are different from the above correctly answered questions and appropriate for this educational level."""},
-                {"role": "user", "content": combined_context}
-            ]
+                Please generate {num_questions} NEW questions that are different from the above correctly answered questions and appropriate for this educational level."""
 
-            questions = self.ml_manager.chat_completion(
-                question_messages,
-                temperature=self.temperatures['question_generation']
-            ).strip()
+        return question_prompt, combined_context, ' | '.join(topics) or None
 
-            # Then generate options for the questions with improved prompt
-            options_messages = [
-                {"role": "system", "content": """You are a history teacher. Generate 3 possible answers for each question following these rules:
-                1. Only 1 answer should be correct
-                2. All options must be of similar length and detail level
-                3. Wrong answers must be historically plausible but incorrect
-                4. Avoid making the correct answer more detailed than others
-                5. Each option should be 10-15 words maximum
-                
-                Format your response as the following for the 3 questions and do not write anything else:
-                question <question>:
-                - wrong: <wrong answer 1>
-                - wrong: <wrong answer 2>
-                - correct: <correct answer>
-                Do the same for the other questions."""},
-                {"role": "user", "content": f"Questions: {questions}\nContext: {combined_context}"}
-            ]
+    def generate_quiz(self, educational_stage: str, level: int, answered_questions: List[str], num_questions: int = 5,
+                      answered_embeddings=None) -> List[Dict]:
+        """Generate a quiz in one JSON-mode call, falling back to the two-call text pipeline of quiz1.py.
 
+        answered_embeddings, when given, is the matrix of answered question embeddings
+        (ProgressManager.get_answered_embeddings), otherwise the questions are encoded here.
+        """
+        try:
+            prepared = self._prepare_generation(educational_stage, level, answered_questions, num_questions,
+                                                answered_embeddings)
+            if prepared is None:
+                return []
+            question_prompt, combined_context, topic = prepared
 
-            options = self.ml_manager.chat_completion(
-                options_messages,
-                temperature=self.temperatures['answer_generation']
-                ).strip()
-            quiz_questions = self._parse_questions([options])
-            # check if parsing succeeded, else regenerate the answers for the questions for 3 attempts 
+            quiz_questions = []
+            if Config.QUIZ_JSON_MODE:
+                try:
+                    quiz_questions = self._generate_quiz_json(question_prompt, combined_context, num_questions)
+                except Exception as e:
+                    print(f"JSON quiz generation failed, falling back to text generation: {e}")
 
             if not quiz_questions:
-                for _ in range(3):
-                    options = self.ml_manager.chat_completion(options_messages, self.temperatures['answer_generation']).strip()
-                    quiz_questions = self._parse_questions([options])
-                    if quiz_questions:
-                        break
+                quiz_questions = self._generate_quiz_text(question_prompt, combined_context)
+
+            if quiz_questions and self.question_bank is not None:
+                self._bank_questions(educational_stage, level, quiz_questions, topic)
+
             # Shuffle answers for each question
             for question in quiz_questions:
                 self._shuffle_answers(question)
@@ -168,6 +228,111 @@ class QuizManager:
             print(f"Error generating quiz: {e}")
             return []
 
+    def _bank_questions(self, educational_stage: str, level: int, quiz_questions: List[Dict], topic: str = None):
+        try:
+            embeddings = self.ml_manager.encode_texts([q['question'] for q in quiz_questions], cache=False)
+            self.question_bank.add(educational_stage, level, quiz_questions, embeddings, topic)
+        except Exception as e:
+            print(f"Error adding questions to the bank: {e}")
+
+    def _request_json(self, messages: List[Dict], temperature: float) -> Dict:
+        return json.loads(self.ml_manager.chat_completion(
+            messages,
+            temperature=temperature,
+            response_format={"type": "json_object"}
+        ))
+
+    def _generate_quiz_json(self, question_prompt: str, combined_context: str, num_questions: int) -> List[Dict]:
+        """One call for questions, options and correctness, then one repair call for the invalid items only."""
+        messages = [
+            {"role": "system", "content": question_prompt + "\n" + QUIZ_JSON_INSTRUCTIONS},
+            {"role": "user", "content": combined_context}
+        ]
+        items = self._request_json(messages, self.temperatures['question_generation']).get('questions')
+        if not isinstance(items, list):
+            return []
+
+        items = items[:num_questions]
+        errors = {i: question_errors(item) for i, item in enumerate(items)}
+        invalid = [i for i, item_errors in errors.items() if item_errors]
+
+        if invalid:
+            repair_messages = [
+                {"role": "system", "content": "You are a history teacher fixing quiz questions in Arabic ONLY.\n"
+                                              "Fix every question listed below so it passes validation. "
+                                              + QUIZ_JSON_INSTRUCTIONS},
+                {"role": "user", "content": json.dumps({
+                    "context": combined_context,
+                    "questions": [{"question": items[i], "errors": errors[i]} for i in invalid]
+                }, ensure_ascii=False)}
+            ]
+            try:
+                repaired = self._request_json(repair_messages, self.temperatures['answer_generation']).get('questions')
+            except Exception as e:
+                print(f"Error repairing quiz questions: {e}")
+                repaired = None
+            if isinstance(repaired, list):
+                for i, item in zip(invalid, repaired):
+                    items[i] = item
+
+        return [
+            {
+                "id": question_id,
+                "question": item["question"].strip(),
+                "answers": [
+                    {"optionLabel": option["text"].strip(), "isCorrect": 1 if option["correct"] else 0, "index": idx}
+                    for idx, option in enumerate(item["options"])
+                ]
+            }
+            for question_id, item in enumerate((item for item in items if not question_errors(item)), start=1)
+        ]
+
+    def _generate_quiz_text(self, question_prompt: str, combined_context: str) -> List[Dict]:
+        """Legacy pipeline: questions as free text, then options in a second call parsed by _parse_questions."""
+        question_messages = [
+            {"role": "system", "content": question_prompt},
+            {"role": "user", "content": combined_context}
+        ]
+
+        questions = self.ml_manager.chat_completion(
+            question_messages,
+            temperature=self.temperatures['question_generation']
+        ).strip()
+
+        # Then generate options for the questions with improved prompt
+        options_messages = [
+            {"role": "system", "content": """You are a history teacher. Generate 3 possible answers for each question following these rules:
+            1. Only 1 answer should be correct
+            2. All options must be of similar length and detail level
+            3. Wrong answers must be historically plausible but incorrect
+            4. Avoid making the correct answer more detailed than others
+            5. Each option should be 10-15 words maximum
+            
+            Format your response as the following for the 3 questions and do not write anything else:
+            question <question>:
+            - wrong: <wrong answer 1>
+            - wrong: <wrong answer 2>
+            - correct: <correct answer>
+            Do the same for the other questions."""},
+            {"role": "user", "content": f"Questions: {questions}\nContext: {combined_context}"}
+        ]
+
+
+        options = self.ml_manager.chat_completion(
+            options_messages,
+            temperature=self.temperatures['answer_generation']
+            ).strip()
+        quiz_questions = self._parse_questions([options])
+        # check if parsing succeeded, else regenerate the answers for the questions for 3 attempts 
+
+        if not quiz_questions:
+            for _ in range(3):
+                options = self.ml_manager.chat_completion(options_messages, self.temperatures['answer_generation']).strip()
+                quiz_questions = self._parse_questions([options])
+                if quiz_questions:
+                    break
+        return quiz_questions
+
     def _shuffle_answers(self, question):
         """Shuffle the answers and update their indices."""
         answers = question['answers']
@@ -229,27 +394,29 @@ class QuizManager:
 
         return questions
 
-    def evaluate_answer(self, question_id: int, selected_option: int, quiz_data: List[Dict]) -> bool:
+    def evaluate_answer(self, question_id: int, selected_option: int, quiz_data: Dict[int, Dict]) -> bool:
+        """Grade one answer, quiz_data maps question id to the question with its answer key."""
         try:
             question_id = int(question_id)
             selected_option = int(selected_option)
             
-            question = next((q for q in quiz_data if q['id'] == question_id), None)
+            question = quiz_data.get(question_id)
             if not question:
                 print(f"Question not found for ID: {question_id}")
                 return False
 
-            # Find the selected answer
-            selected_answer = next((ans for ans in question['answers'] 
-                                 if ans['index'] == selected_option), None)
-            
-            if not selected_answer:
+            # Answer indices are positions after shuffling, see _shuffle_answers
+            answers = question['answers']
+            if not 0 <= selected_option < len(answers) or answers[selected_option]['index'] != selected_option:
                 print(f"No answer found with index {selected_option}")
                 return False
-                
-            print(f"Debug - Selected answer: {selected_answer}")
-            return selected_answer['isCorrect'] == 1
+
+            return answers[selected_option]['isCorrect'] == 1
 
         except (ValueError, TypeError) as e:
             print(f"Error evaluating answer: {str(e)}")
             return False
+
+    @staticmethod
+    def correct_option(question: Dict) -> Optional[int]:
+        return next((answer['index'] for answer in question['answers'] if answer['isCorrect'] == 1), None)
@@ -0,0 +1,137 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+
+from .config import Config
+from .question_bank import normalize
+
+
+def _question_key(question: str) -> str:
+    return ' '.join(str(question).split())
+
+
+class QuizPool:
+    """Keeps a bounded queue of ready quizzes per (educational_stage, level).
+
+    A quiz is first drawn from the question bank, when there is one, with
+    questions the user has not seen. Pooled quizzes fill the gap: they are
+    generated in the background without any user's history and kept with
+    their question embeddings. A request takes the unseen questions of the
+    first pooled quiz with enough of them, a question counts as seen at
+    seen_threshold cosine similarity to one the user answered, as in
+    QuestionBank.select. When none fits the missing questions are generated
+    inline. Every request that needed the pool tops it back up asynchronously.
+    """
+
+    def __init__(self, quiz_manager, size: int = None, max_workers: int = None,
+                 num_questions: int = None, attempts: int = None, question_bank=None,
+                 seen_threshold: float = None):
+        self.quiz_manager = quiz_manager
+        self.question_bank = question_bank
+        self.seen_threshold = seen_threshold or Config.QUESTION_BANK_SEEN_THRESHOLD
+        self.size = size or Config.QUIZ_POOL_SIZE
+        self.num_questions = num_questions or Config.QUIZ_POOL_QUESTIONS
+        self.attempts = attempts or Config.QUIZ_GENERATION_ATTEMPTS
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or Config.MAX_WORKERS,
+                                           thread_name_prefix="quiz-pool")
+        self.pools: Dict[tuple, deque] = {}
+        self.pending: Dict[tuple, int] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def is_valid_quiz(quiz: List[Dict]) -> bool:
+        """A quiz is usable when every question has text and exactly one correct answer."""
+        return bool(quiz) and all(
+            question.get('question') and len(question.get('answers', [])) >= 2
+            and sum(answer.get('isCorrect') == 1 for answer in question['answers']) == 1
+            for question in quiz
+        )
+
+    def _generate(self, educational_stage: str, level: int, answered_questions: List[str],
+                  num_questions: int, answered_embeddings=None) -> List[Dict]:
+        for _ in range(self.attempts):
+            quiz = self.quiz_manager.generate_quiz(
+                educational_stage, level, answered_questions, num_questions=num_questions,
+                answered_embeddings=answered_embeddings)
+            if self.is_valid_quiz(quiz):
+                return quiz
+        return []
+
+    def _fill_one(self, key):
+        try:
+            quiz = self._generate(key[0], key[1], [], self.num_questions)
+            if quiz:
+                vectors = normalize(self.quiz_manager.ml_manager.encode_texts(
+                    [question['question'] for question in quiz], cache=False))
+                with self.lock:
+                    self.pools.setdefault(key, deque(maxlen=self.size)).append((quiz, vectors))
+        except Exception as e:
+            logging.error(f"Error pre-generating quiz for {key}: {str(e)}")
+        finally:
+            with self.lock:
+                self.pending[key] -= 1
+
+    def refill(self, educational_stage: str, level: int):
+        """Queue background generation for whatever the pool is missing."""
+        key = (educational_stage, int(level))
+        with self.lock:
+            missing = self.size - len(self.pools.get(key, ())) - self.pending.get(key, 0)
+            if missing <= 0:
+                return
+            self.pending[key] = self.pending.get(key, 0) + missing
+        for _ in range(missing):
+            self.executor.submit(self._fill_one, key)
+
+    def _take(self, key, excluded: set, answered_embeddings, num_questions: int):
+        """Take the first pooled quiz with num_questions questions the user has not seen, returning those."""
+        answered = None
+        if answered_embeddings is not None and len(answered_embeddings):
+            answered = normalize(answered_embeddings)
+        with self.lock:
+            pool = self.pools.get(key)
+            if not pool:
+                return None
+            for entry in pool:
+                quiz, vectors = entry
+                unseen = np.array([_question_key(question['question']) not in excluded for question in quiz])
+                if answered is not None:
+                    unseen &= (vectors @ answered.T).max(axis=1) < self.seen_threshold
+                if unseen.sum() >= num_questions:
+                    pool.remove(entry)
+                    return [question for question, keep in zip(quiz, unseen) if keep][:num_questions]
+        return None
+
+    def get_quiz(self, educational_stage: str, level: int, answered_questions: List[str],
+                 num_questions: int = 5, answered_embeddings=None, use_bank: bool = True):
+        """Return (quiz, from_bank) where from_bank is True when no question had to come from the LLM."""
+        key = (educational_stage, int(level))
+        answered = {_question_key(question) for question in answered_questions or []}
+
+        quiz = []
+        if use_bank and self.question_bank is not None:
+            quiz = self.question_bank.select(
+                educational_stage, level, answered_embeddings, answered_questions, num_questions)
+
+        missing = num_questions - len(quiz)
+        if missing > 0:
+            excluded = answered | {_question_key(question['question']) for question in quiz}
+            extra = self._take(key, excluded, answered_embeddings, missing)
+            if extra is None:
+                extra = self._generate(educational_stage, level, answered_questions, missing,
+                                       answered_embeddings)
+            quiz += [q for q in extra if _question_key(q['question']) not in excluded][:missing]
+            self.refill(educational_stage, level)
+
+        # Questions from different sources are renumbered for the client
+        return [dict(question, id=i) for i, question in enumerate(quiz, start=1)], missing <= 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                f"{stage}/{level}": {"ready": len(pool), "pending": self.pending.get((stage, level), 0)}
+                for (stage, level), pool in self.pools.items()
+            }
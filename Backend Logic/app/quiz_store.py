@@ -0,0 +1,132 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from .config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quizzes (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    educational_stage TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    questions TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quizzes_created ON quizzes (created);
+CREATE TABLE IF NOT EXISTS locked_answers (
+    quiz_id TEXT NOT NULL REFERENCES quizzes (id) ON DELETE CASCADE,
+    question_id INTEGER NOT NULL,
+    selected_option INTEGER NOT NULL,
+    PRIMARY KEY (quiz_id, question_id)
+);
+"""
+
+
+class QuizStore:
+    """Generated quizzes kept server-side under a quiz id until submitted or expired.
+
+    Quizzes live in a SQLite file (WAL) so every worker process can check and
+    grade any quiz, whichever worker generated it. Each quiz maps question id
+    to the question with its answer key, so the answer key never has to reach
+    the client. The first answer checked for a question is locked, so a client
+    cannot probe every option before submitting. Quizzes older than ttl
+    seconds are gone, the file keeps at most max_size of them.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str = None, ttl: float = None, max_size: int = None):
+        self.path = path or Config.QUIZ_STORE_FILE
+        self.ttl = ttl or Config.QUIZ_STORE_TTL
+        self.max_size = max_size or Config.QUIZ_STORE_SIZE
+        self._local = threading.local()
+        self._puts = 0
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA foreign_keys=ON")
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def public_quiz(quiz: List[Dict]) -> List[Dict]:
+        """The quiz as sent to the client, without the isCorrect flags."""
+        return [
+            {
+                "id": question["id"],
+                "question": question["question"],
+                "answers": [{"optionLabel": a["optionLabel"], "index": a["index"]} for a in question["answers"]]
+            }
+            for question in quiz
+        ]
+
+    def put(self, email: str, educational_stage: str, level: int, quiz: List[Dict]) -> str:
+        quiz_id = uuid.uuid4().hex
+        now = time.time()
+        db = self._connect()
+        with db:
+            db.execute(
+                "INSERT INTO quizzes (id, email, educational_stage, level, questions, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (quiz_id, email, educational_stage, int(level), json.dumps(quiz, ensure_ascii=False), now))
+
+            self._puts += 1
+            if self._puts % self.PRUNE_EVERY == 0:
+                db.execute("DELETE FROM quizzes WHERE created < ?", (now - self.ttl,))
+                db.execute(
+                    "DELETE FROM quizzes WHERE id NOT IN "
+                    "(SELECT id FROM quizzes ORDER BY created DESC LIMIT ?)", (self.max_size,))
+        return quiz_id
+
+    def _entry(self, db, quiz_id: str, email: str = None) -> Optional[Dict]:
+        row = db.execute(
+            "SELECT email, educational_stage, level, questions, created FROM quizzes WHERE id = ? AND created >= ?",
+            (quiz_id, time.time() - self.ttl)).fetchone()
+        if row is None or (email is not None and row[0] != email):
+            return None
+        locked = db.execute(
+            "SELECT question_id, selected_option FROM locked_answers WHERE quiz_id = ?", (quiz_id,)).fetchall()
+        return {
+            "email": row[0],
+            "educational_stage": row[1],
+            "level": row[2],
+            "questions": {int(question["id"]): question for question in json.loads(row[3])},
+            "locked": dict(locked),
+            "created": row[4],
+        }
+
+    def get(self, quiz_id: str, email: str = None) -> Optional[Dict]:
+        """The stored quiz, or None if unknown, expired or generated for another user."""
+        return self._entry(self._connect(), quiz_id, email)
+
+    def lock_answer(self, quiz_id: str, question_id: int, selected_option: int) -> Optional[int]:
+        """Record the first answer given to a question and return the answer that counts, None if the quiz is gone."""
+        db = self._connect()
+        with db:
+            # Nothing is locked once the quiz was submitted in the meantime
+            db.execute(
+                "INSERT OR IGNORE INTO locked_answers (quiz_id, question_id, selected_option) "
+                "SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM quizzes WHERE id = ?)",
+                (quiz_id, int(question_id), int(selected_option), quiz_id))
+            row = db.execute(
+                "SELECT selected_option FROM locked_answers WHERE quiz_id = ? AND question_id = ?",
+                (quiz_id, int(question_id))).fetchone()
+        return row[0] if row else None
+
+    def pop(self, quiz_id: str, email: str = None) -> Optional[Dict]:
+        """Remove and return the stored quiz, None if it is gone, so only one submission can grade it."""
+        db = self._connect()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            entry = self._entry(db, quiz_id, email)
+            if entry is not None:
+                db.execute("DELETE FROM quizzes WHERE id = ?", (quiz_id,))
+        return entry
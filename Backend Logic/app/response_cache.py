@@ -0,0 +1,111 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def normalize_question(question: str) -> str:
+    """Collapse whitespace, lowercase and drop trailing punctuation so trivial variants share a key."""
+    return ' '.join(str(question).split()).lower().strip(' .!?؟')
+
+
+def response_key(question: str, educational_stage=None, historical_era=None, topic=None, model=None) -> str:
+    if not historical_era or historical_era == 'None':
+        historical_era = None
+    parts = (normalize_question(question), educational_stage, historical_era, topic, model)
+    return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Exact-match answer cache: an in-memory LRU in front of a SQLite file.
+
+    Keys are response_key hashes, so the same question is cached separately
+    per stage, era, topic and model. Every answer is written through to disk,
+    memory misses fall back to the file and are promoted into the LRU, so a
+    restart starts warm. Answers older than ttl seconds are misses. The file
+    keeps at most disk_size answers, expired and then the oldest are pruned
+    first.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str, max_size: int, disk_size: int, ttl: float):
+        self.path = path
+        self.max_size = max_size
+        self.disk_size = disk_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, answer TEXT NOT NULL, created REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+        self._db.commit()
+
+    def _remember(self, key, answer, created):
+        self._entries[key] = (answer, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        oldest = time.time() - self.ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] >= oldest:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+            row = self._db.execute(
+                "SELECT answer, created FROM responses WHERE key = ? AND created >= ?", (key, oldest)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._remember(key, row[0], row[1])
+            self.disk_hits += 1
+            return row[0]
+
+    def put(self, key: str, answer: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, answer, now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, answer, created) VALUES (?, ?, ?)",
+                (key, answer, now))
+
+            self._puts += 1
+            if self._puts % self.PRUNE_EVERY == 0:
+                self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                self._db.execute(
+                    "DELETE FROM responses WHERE key NOT IN "
+                    "(SELECT key FROM responses ORDER BY created DESC LIMIT ?)", (self.disk_size,))
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            disk_size = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "disk_size": disk_size,
+                "max_disk_size": self.disk_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0,
+            }
@@ -1,9 +1,14 @@
-from flask import Blueprint, request, jsonify
-from app.chat import answer_question_with_relevant_content_GN
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from app.chat import answer_question_with_relevant_content_GN, stream_answer_with_relevant_content_GN, save_chat_turn
+from app.config import Config
 from app.session_manager import SessionManager
+from app.sqlite_session_manager import SqliteSessionManager
 from app.user_manager import UserManager
 from app.ml_manager import MLManager
 from app.quiz_manager import QuizManager
+from app.quiz_pool import QuizPool
+from app.question_bank import QuestionBank
+from app.quiz_store import QuizStore
 from app.progress_manager import ProgressManager
 from app.personality_quiz_manager import PersonalityQuizManager
 from app.personality_progress_manager import PersonalityProgressManager
@@ -16,14 +21,21 @@ bp = Blueprint('routes', __name__)
 
 # Initialize managers
 ml_manager = MLManager()
-session_manager = SessionManager("sessions.json")
+if Config.SESSION_BACKEND == 'sqlite':
+    session_manager = SqliteSessionManager(Config.SESSION_DB_FILE, import_json=Config.SESSION_JSON_FILE)
+else:
+    session_manager = SessionManager(Config.SESSION_JSON_FILE)
 user_manager = UserManager("users.json")
-progress_manager = ProgressManager("progress.json")
-quiz_manager = QuizManager(ml_manager)
+progress_manager = ProgressManager(
+    "progress.json", encoder=lambda questions: ml_manager.encode_texts(questions, cache=False))
+question_bank = QuestionBank()
+quiz_manager = QuizManager(ml_manager, question_bank=question_bank)
+quiz_pool = QuizPool(quiz_manager, question_bank=question_bank)
+quiz_store = QuizStore()
 personality_quiz_manager = PersonalityQuizManager()
-personality_progress_manager = PersonalityProgressManager()
+personality_progress_manager = PersonalityProgressManager(legacy_row_ids=personality_quiz_manager.legacy_row_ids)
 events_quiz_manager = EventsQuizManager()
-events_progress_manager = EventsProgressManager()
+events_progress_manager = EventsProgressManager(legacy_row_ids=events_quiz_manager.legacy_row_ids)
 topic_manager = TopicManager(ml_manager)
 
 
@@ -62,6 +74,11 @@ def login():
     return jsonify({"error": result}), 401
 
 
+def is_first_turn(email, session_nonce):
+    session = session_manager.get_session(email, session_nonce)
+    return not session or not session.get("content")
+
+
 @bp.route('/ask', methods=['POST', 'OPTIONS'])
 def ask_question():
     if request.method == 'OPTIONS':
@@ -82,12 +99,14 @@ def ask_question():
         session_nonce = session_manager.create_session(
             email, educational_stage, topic)
 
-        # Check cache first
-    cached = ml_manager.get_cached_response(question)
+    # Only first-turn answers are cached, later ones depend on the conversation
+    first_turn = is_first_turn(email, session_nonce)
+    cached = ml_manager.get_cached_response(
+        question, educational_stage, historical_era, topic) if first_turn else None
     if cached:
         # Still log to session but return cached
-        session_manager.add_to_session(
-            email, EducationalStage, session_nonce, question, cached)
+        save_chat_turn(email, question, cached, session_manager, ml_manager,
+                       session_nonce, educational_stage, topic)
         return jsonify({
             "session_nonce": session_nonce,
             "answer": cached
@@ -97,20 +116,97 @@ def ask_question():
         email=email,
         query=question,
         data=ml_manager.get_data(),
+        passages=ml_manager.get_passages(),
         session_manager=session_manager,
-        model=ml_manager.get_model(),
+        ml_manager=ml_manager,
+        index=ml_manager.get_faiss_index(),
         session_nonce=session_nonce,
         EducationalStage=educational_stage,
         HistoricalEra=historical_era,
         Topic=topic
     )
 
+    if first_turn:
+        ml_manager.cache_response(question, answer, educational_stage, historical_era, topic)
+
     return jsonify({
         "session_nonce": session_nonce,
         "answer": answer
     }), 200
 
 
+@bp.route('/ask/stream', methods=['POST', 'OPTIONS'])
+def ask_question_stream():
+    """Same payload as /ask, answers as Server-Sent Events: a `session` event with the
+    session nonce, one `data: {"token": ...}` message per chunk, then a `done` event."""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+
+    payload = request.get_json()
+    email = payload.get('email')
+    question = payload.get('question')
+    educational_stage = payload.get('educational_stage')
+    historical_era = payload.get('historical_era', None)
+    session_nonce = payload.get('session_nonce', None)
+    topic = payload.get('topic', None)
+
+    if not email or not question:
+        return jsonify({"error": "Missing required fields"}), 400
+
+    if not session_nonce or session_nonce == "None":
+        session_nonce = session_manager.create_session(
+            email, educational_stage, topic)
+
+    def sse(data, event=None):
+        prefix = f"event: {event}\n" if event else ""
+        return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    first_turn = is_first_turn(email, session_nonce)
+    cached = ml_manager.get_cached_response(
+        question, educational_stage, historical_era, topic) if first_turn else None
+
+    def generate():
+        yield sse({"session_nonce": session_nonce}, event="session")
+        if cached:
+            save_chat_turn(email, question, cached, session_manager, ml_manager,
+                           session_nonce, educational_stage, topic)
+            yield sse({"token": cached})
+            yield sse({"session_nonce": session_nonce, "answer": cached}, event="done")
+            return
+
+        answer = []
+        try:
+            for token in stream_answer_with_relevant_content_GN(
+                email=email,
+                query=question,
+                data=ml_manager.get_data(),
+                passages=ml_manager.get_passages(),
+                session_manager=session_manager,
+                ml_manager=ml_manager,
+                index=ml_manager.get_faiss_index(),
+                session_nonce=session_nonce,
+                EducationalStage=educational_stage,
+                HistoricalEra=historical_era,
+                Topic=topic
+            ):
+                answer.append(token)
+                yield sse({"token": token})
+        except Exception as e:
+            print(f"Error streaming answer: {str(e)}")
+            yield sse({"error": "Internal server error"}, event="error")
+            return
+
+        if first_turn:
+            ml_manager.cache_response(question, ''.join(answer), educational_stage, historical_era, topic)
+        yield sse({"session_nonce": session_nonce, "answer": ''.join(answer)}, event="done")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @bp.route('/sessions', methods=['GET'])
 def get_user_sessions():
     email = request.args.get('email')
@@ -129,58 +225,77 @@ def generate_quiz():
     educational_stage = payload.get('educational_stage')
     level = payload.get('level')
     num_questions = payload.get('num_questions', 5)
-    use_cache = payload.get('use_cache', True)  # Add cache control
+    use_cache = payload.get('use_cache', True)  # False skips the question bank
 
     if not all([email, educational_stage, level]):
         return jsonify({"error": "Missing required fields"}), 400
+
+    try:
+        level = int(level)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid level"}), 400
+    if not 1 <= level <= progress_manager.MAX_LEVELS:
+        return jsonify({"error": "Invalid level"}), 400
     print(f"Generating quiz for {email} in {educational_stage} level {level}")
-    # Check cache first if enabled
-    if use_cache:
-        email = "student@example.com"
-        educational_stage = "HSS3"
-        try:
-            with open('quiz_cache.json', 'r', encoding='utf-8') as f:
-                cache = json.load(f)
-                if (email in cache and 
-                    educational_stage in cache[email] and 
-                    str(level) in cache[email][educational_stage]):
-                    cached_quiz = cache[email][educational_stage][str(level)]['quiz']
-                    return jsonify({
-                        "quiz": cached_quiz,
-                        "total_questions": len(cached_quiz),
-                        "cached": True
-                    }), 200
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print(f"Cache error: {str(e)}")
-            # Continue with normal quiz generation if cache fails
-
-    # If not in cache or cache disabled, generate normally
+
     answered_questions = progress_manager.get_answered_questions(
         email, educational_stage, level)
+    answered_embeddings = progress_manager.get_answered_embeddings(
+        email, educational_stage, level)
 
-    quiz = quiz_manager.generate_quiz(
+    # Unseen questions from the bank first, then a pre-generated quiz for the rest,
+    # generating inline (with retries) only when neither has enough
+    quiz, cached = quiz_pool.get_quiz(
         educational_stage,
         level,
         answered_questions,
-        num_questions=num_questions
+        num_questions=num_questions,
+        answered_embeddings=answered_embeddings,
+        use_bank=use_cache
     )
 
-    # if parsing fails the quiz will be none, so attempt 3 times to generate again
-    if not quiz:
-        for i in range(3):
-            quiz = quiz_manager.generate_quiz(
-                educational_stage,
-                level,
-                answered_questions,
-                num_questions=num_questions
-            )
-            if quiz:
-                break
+    # The answer key stays on the server, the client submits answers against the quiz id
+    quiz_id = quiz_store.put(email, educational_stage, level, quiz) if quiz else None
 
     return jsonify({
-        "quiz": quiz,
+        "quiz_id": quiz_id,
+        "quiz": QuizStore.public_quiz(quiz),
         "total_questions": len(quiz),
-        "cached": False
+        "cached": cached
+    }), 200
+
+
+@bp.route('/quiz/check', methods=['POST'])
+def check_quiz_answer():
+    """Grade one answer for immediate feedback, the first answer to a question is the one submitted."""
+    payload = request.get_json()
+    email = payload.get('email')
+    quiz_id = payload.get('quiz_id')
+    question_id = payload.get('question_id')
+    selected_option = payload.get('selected_option')
+
+    if not all([email, quiz_id]) or question_id is None or selected_option is None:
+        return jsonify({"error": "Missing required fields"}), 400
+
+    quiz = quiz_store.get(quiz_id, email)
+    if quiz is None:
+        return jsonify({"error": "Quiz not found or expired"}), 404
+
+    try:
+        question = quiz["questions"].get(int(question_id))
+        if question is None:
+            return jsonify({"error": "Question not found"}), 404
+        selected_option = quiz_store.lock_answer(quiz_id, question_id, selected_option)
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid data"}), 400
+    if selected_option is None:
+        return jsonify({"error": "Quiz not found or expired"}), 404
+
+    return jsonify({
+        "question_id": int(question_id),
+        "selected_option": selected_option,
+        "correct": quiz_manager.evaluate_answer(question_id, selected_option, quiz["questions"]),
+        "correct_option": QuizManager.correct_option(question)
     }), 200
 
 
@@ -188,28 +303,42 @@ def generate_quiz():
 def submit_quiz():
     payload = request.get_json()
     email = payload.get('email')
-    educational_stage = payload.get('educational_stage')
-    level = payload.get('level')
     answers = payload.get('answers')  # {question_id: selected_option}
-    quiz_data = payload.get('quiz_data')
+    quiz_id = payload.get('quiz_id')
 
-    if not all([email, educational_stage, level, answers, quiz_data]):
+    if not all([email, quiz_id, answers]):
         return jsonify({"error": "Missing required fields"}), 400
 
+    # Taken out before grading, so a quiz can only be submitted once, also by concurrent requests
+    stored_quiz = quiz_store.pop(quiz_id, email)
+    if stored_quiz is None:
+        return jsonify({"error": "Quiz not found or expired"}), 404
+    questions = stored_quiz["questions"]
+    locked = stored_quiz["locked"]
+    # Progress goes to the stage and level the quiz was generated for
+    educational_stage = stored_quiz["educational_stage"]
+    level = stored_quiz["level"]
+
     try:
         start_time = payload.get('start_time')  # Add timestamp tracking
         end_time = payload.get('end_time')
         
         results = []
+        graded = []  # (result, question text, is_correct) of every valid answer
         total_correct = 0
         total_incorrect = 0
-        last_progress = None
         
         for question_id, selected_option in answers.items():
             try:
                 question_id = int(question_id)
+                question = questions.get(question_id)
+                if question is None:
+                    raise ValueError(f"Unknown question id {question_id}")
+
+                # Answers already checked through /quiz/check can't be changed
+                selected_option = locked.get(question_id, selected_option)
                 is_correct = quiz_manager.evaluate_answer(
-                    question_id, selected_option, quiz_data)
+                    question_id, selected_option, questions)
                     
                 if is_correct:
                     total_correct += 1
@@ -220,27 +349,21 @@ def submit_quiz():
                     "question_id": question_id,
                     "correct": is_correct,
                 }
-                
-                question = next(q for q in quiz_data if q['id'] == question_id)
-                progress = progress_manager.update_progress(
-                    email, educational_stage, level,
-                    question['question'], is_correct
-                )
-                last_progress = progress  # Save the last progress update
-                
-                results.append({
-                    "question_id": question_id,
-                    "correct": is_correct,
-                    "progress": progress
-                })
+                results.append(result)
+                graded.append((result, question['question'], is_correct))
 
             except ValueError as e:
                 print(f"Error processing question {question_id}: {str(e)}")
                 results.append({"question_id": question_id, "correct": False, "error": "Invalid data"})
 
-        # Get final level progress
-        final_progress = progress_manager.calculate_level_progress(
-            email, educational_stage, level)
+        # All answers are applied in memory and saved once, level stats are computed once
+        batch = progress_manager.update_progress_batch(
+            email, educational_stage, level,
+            [(question, is_correct) for _, question, is_correct in graded])
+        for (result, _, _), progress in zip(graded, batch["results"]):
+            result["progress"] = progress
+
+        final_progress = batch["level_progress"]
 
         summary = {
             "total_questions": len(answers),
@@ -252,8 +375,7 @@ def submit_quiz():
         }
         
         # Add mastery stats to the response
-        mastery_stats = progress_manager.get_mastery_stats(
-            email, educational_stage, level)
+        mastery_stats = batch["mastery_stats"]
         
         return jsonify({
             "results": results,
@@ -317,12 +439,12 @@ def generate_personality_quiz():
     if not all([email, educational_stage]):
         return jsonify({"error": "Missing required fields"}), 400
 
-    solved_questions = personality_progress_manager.get_solved_questions(
+    solved_ids = personality_progress_manager.get_solved_ids(
         email, educational_stage)
 
     quiz = personality_quiz_manager.generate_quiz(
         educational_stage,
-        solved_questions,
+        solved_ids,
         num_questions
     )
 
@@ -341,7 +463,14 @@ def submit_personality_quiz():
     if not all([email, educational_stage, matches]):
         return jsonify({"error": "Missing required fields"}), 400
 
+    # Ids are dataset row ids of the stage, clients built before that sent positions
+    for match in matches:
+        if not all(personality_quiz_manager.is_stage_row(educational_stage, match.get(key))
+                   for key in ['personality_id', 'description_id']):
+            return jsonify({"error": "Invalid personality or description id"}), 400
+
     results = []
+    solved = []
     for match in matches:
         is_correct = personality_quiz_manager.validate_answer(
             match['personality_id'],
@@ -349,28 +478,21 @@ def submit_personality_quiz():
         )
         
         if is_correct:
-            # Get the personality data from the quiz data
-            personality_data = {
-                'name': match['personality_name'],
-                'description': match['description'],
-                'image_link': match['image_link'] if 'image_link' in match else None
-            }
-            
-            progress = personality_progress_manager.update_progress(
-                email,
-                educational_stage,
-                match['personality_id'],
-                personality_data
-            )
+            solved.append(personality_quiz_manager.personality_id(match['personality_id']))
             
         results.append({
             "personality_id": match['personality_id'],
             "correct": is_correct
         })
 
+    # One save for the whole submission
+    if solved:
+        personality_progress_manager.update_progress_batch(email, educational_stage, solved)
+
     return jsonify({
         "results": results,
-        "progress": personality_progress_manager.get_solved_questions(email, educational_stage)
+        "progress": personality_quiz_manager.solved_personalities(
+            personality_progress_manager.get_solved_ids(email, educational_stage))
     }), 200
 
 @bp.route('/personality/progress', methods=['GET'])
@@ -381,7 +503,8 @@ def get_personality_progress():
     if not all([email, educational_stage]):
         return jsonify({"error": "Missing required fields"}), 400
 
-    progress = personality_progress_manager.get_solved_questions(email, educational_stage)
+    progress = personality_quiz_manager.solved_personalities(
+        personality_progress_manager.get_solved_ids(email, educational_stage))
     return jsonify({"progress": progress}), 200
 
 @bp.route('/events/quiz/generate', methods=['POST'])
@@ -394,12 +517,12 @@ def generate_events_quiz():
     if not all([email, educational_stage]):
         return jsonify({"error": "Missing required fields"}), 400
 
-    solved_questions = events_progress_manager.get_solved_questions(
+    solved_ids = events_progress_manager.get_solved_ids(
         email, educational_stage)
 
     quiz = events_quiz_manager.generate_quiz(
         educational_stage,
-        solved_questions,
+        solved_ids,
         num_questions
     )
 
@@ -421,7 +544,13 @@ def submit_events_quiz():
     if not all([email, educational_stage, answers]):
         return jsonify({"error": "Missing required fields"}), 400
 
+    # Only events of the submitted stage are graded and counted in its progress
+    for answer in answers:
+        if not events_quiz_manager.is_stage_row(educational_stage, answer.get('question_id')):
+            return jsonify({"error": "Invalid question id"}), 400
+
     results = []
+    graded = []
     for answer in answers:
         question_id = answer['question_id']
         answer_text = answer['answer']
@@ -433,29 +562,25 @@ def submit_events_quiz():
         is_correct = False
         if question_type == 0:  # date->event
             # Convert answer to embedding using the same model as quiz manager
-            answer_embedding = ml_manager.get_model().encode(answer_text)
+            answer_embedding = ml_manager.encode_text(answer_text)
             is_correct = events_quiz_manager.validate_event_answer(
                 answer_embedding, question_id)
         else:  # event->date
             is_correct = events_quiz_manager.validate_date_answer(
                 answer_text, question_data['Date'])
 
-        progress = events_progress_manager.update_progress(
-            email,
-            educational_stage,
-            {
-                "date": question_data['Date'],
-                "event": question_data['Content']
-            },
-            is_correct
-        )
+        graded.append((question_id, is_correct))
         
         results.append({
             "question_id": question_id,
-            "correct": is_correct,
-            "progress": progress
+            "correct": is_correct
         })
 
+    # One save for the whole submission
+    progress = events_progress_manager.update_progress_batch(email, educational_stage, graded)
+    for result in results:
+        result["progress"] = progress
+
     return jsonify({
         "results": results
     }), 200
@@ -468,10 +593,9 @@ def get_events_progress():
     if not all([email, educational_stage]):
         return jsonify({"error": "Missing required fields"}), 400
 
-    progress = events_progress_manager.get_solved_questions(email, educational_stage)
-    total_events = len(events_quiz_manager.data[
-        events_quiz_manager.data['Educational stage'] == educational_stage
-    ])
+    solved_ids = events_progress_manager.get_solved_ids(email, educational_stage)
+    progress = events_quiz_manager.solved_events(solved_ids)
+    total_events = len(events_quiz_manager.stage_rows.get(educational_stage, []))
     
     stats = {
         "solved_questions": progress,
@@ -595,6 +719,16 @@ def get_detailed_stats():
         print(f"Error getting detailed stats: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+@bp.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({
+        "embedding_cache": ml_manager.get_embedding_cache_stats(),
+        "response_cache": ml_manager.get_response_cache_stats(),
+        "answer_cache": ml_manager.get_answer_cache_stats(),
+        "quiz_pool": quiz_pool.stats(),
+        "question_bank": question_bank.stats()
+    }), 200
+
 @bp.route('/session-content', methods=['GET'])
 def get_session_content():
     email = request.args.get('email')
@@ -612,5 +746,10 @@ def get_session_content():
             "content": []
         }), 200  # Return empty content instead of 404
         
-    return jsonify({"content": session["content"]}), 200
+    # Turn embeddings are only used for retrieval context
+    content = [
+        {key: value for key, value in entry.items() if key != "embedding"}
+        for entry in session["content"]
+    ]
+    return jsonify({"content": content}), 200
 
@@ -1,26 +1,20 @@
-import json
 from datetime import datetime, timedelta
 import uuid
 
+from .embedding_codec import encode_embedding
+from .persistence import JsonFile
+
 
 class SessionManager:
     def __init__(self, session_file_path):
         self.session_file_path = session_file_path
-
-    def _read_sessions(self):
-        try:
-            with open(self.session_file_path, "r", encoding="utf-8") as file:
-                return json.load(file)
-        except FileNotFoundError:
-            return {}
-
-    def _write_sessions(self, data):
-        with open(self.session_file_path, "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=4)
+        self.sessions = JsonFile(session_file_path)
 
     def create_session(self, email, educational_stage, topic=None):
+        with self.sessions.update() as sessions:
+            return self._create_session(sessions, email, educational_stage, topic)
 
-        sessions = self._read_sessions()
+    def _create_session(self, sessions, email, educational_stage, topic):
         session_nonce = str(uuid.uuid4())
         current_time = datetime.now()
 
@@ -51,53 +45,61 @@ class SessionManager:
         sessions[email]["last_active"] = current_time.strftime(
             "%Y-%m-%d %H:%M:%S")
 
-        self._write_sessions(sessions)
         return session_nonce
 
-    def add_to_session(self, email, educational_stage, session_nonce, question, answer):
-        sessions = self._read_sessions()
-        current_time = datetime.now()
-
-        if not self._validate_session_exists(sessions, email, educational_stage):
+    def add_to_session(self, email, educational_stage, session_nonce, question, answer, embedding=None):
+        """Append a turn, storing its embedding (if given) so context never re-encodes it."""
+        if not self._validate_session_exists(self.sessions.read(), email, educational_stage):
             return False
 
+        with self.sessions.update() as sessions:
+            return self._add_to_session(sessions, email, educational_stage, session_nonce, question, answer, embedding)
+
+    def _add_to_session(self, sessions, email, educational_stage, session_nonce, question, answer, embedding):
+        current_time = datetime.now()
+
         chat_sessions = sessions[email][educational_stage]["General chatbot"]
         for session in chat_sessions:
             if session["session_nonce"] == session_nonce:
-                session["content"].append({
+                turn = {
                     "question": question,
                     "answer": answer,
                     "datetime": current_time.strftime("%Y-%m-%d %H:%M:%S"),
                     "type": "chat"  # Useful for different types of interactions
-                })
+                }
+                if embedding is not None:
+                    turn["embedding"] = encode_embedding(embedding)
+                session["content"].append(turn)
                 session["last_activity"] = current_time.strftime(
                     "%Y-%m-%d %H:%M:%S")
                 session["questions_count"] += 1
                 sessions[email]["last_active"] = current_time.strftime(
                     "%Y-%m-%d %H:%M:%S")
-                self._write_sessions(sessions)
                 return True
         return False
 
     def get_session(self, email, session_nonce):
         """Get complete session data by nonce."""
-        sessions = self._read_sessions()
-
-        if email not in sessions:
-            return None
-
-        # Search all educational stages for the session
-        for stage in sessions[email]:
-            if stage not in ["current", "last_active"]:
-                for session in sessions[email][stage].get("General chatbot", []):
-                    if session["session_nonce"] == session_nonce:
-                        return session
+        with self.sessions.reading() as sessions:
+            if email not in sessions:
+                return None
+
+            # Search all educational stages for the session
+            for stage in sessions[email]:
+                if stage not in ["current", "last_active"]:
+                    for session in sessions[email][stage].get("General chatbot", []):
+                        if session["session_nonce"] == session_nonce:
+                            # A copy, turns keep being appended to the stored one
+                            return dict(session, content=list(session["content"]))
 
         return None
 
     def clean_old_sessions(self, days_threshold=30):
         """Remove sessions older than the specified threshold."""
-        sessions = self._read_sessions()
+        with self.sessions.update() as sessions:
+            self._clean_old_sessions(sessions, days_threshold)
+
+    def _clean_old_sessions(self, sessions, days_threshold):
         current_time = datetime.now()
         threshold = current_time - timedelta(days=days_threshold)
 
@@ -114,11 +116,12 @@ class SessionManager:
                             active_sessions.append(session)
                     sessions[email][stage]["General chatbot"] = active_sessions
 
-        self._write_sessions(sessions)
-
     def get_user_sessions(self, email):
         """Get all sessions for a user with metadata."""
-        sessions = self._read_sessions()
+        with self.sessions.reading() as sessions:
+            return self._user_sessions(sessions, email)
+
+    def _user_sessions(self, sessions, email):
         if email not in sessions:
             return []
 
@@ -0,0 +1,27 @@
+from bisect import bisect_left
+from typing import Iterable, List
+
+import numpy as np
+
+
+def add_solved(solved_ids: List[int], row_ids: Iterable[int]) -> int:
+    """Insert dataset row ids into a sorted id list in place, returning how many were new."""
+    added = 0
+    for row_id in row_ids:
+        row_id = int(row_id)
+        position = bisect_left(solved_ids, row_id)
+        if position == len(solved_ids) or solved_ids[position] != row_id:
+            solved_ids.insert(position, row_id)
+            added += 1
+    return added
+
+
+def unsolved(row_ids: np.ndarray, solved_ids: List[int], keys: np.ndarray = None) -> np.ndarray:
+    """The row ids whose key (the row id itself by default) is not in solved_ids.
+
+    Keeps the original order and is one vectorized set difference.
+    """
+    if not solved_ids:
+        return row_ids
+    keys = row_ids if keys is None else keys
+    return row_ids[~np.isin(keys, np.asarray(solved_ids, dtype=keys.dtype))]
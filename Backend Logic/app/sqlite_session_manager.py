@@ -0,0 +1,216 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    current TEXT,
+    last_active TEXT
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    email TEXT NOT NULL,
+    educational_stage TEXT,
+    session_nonce TEXT NOT NULL,
+    topic TEXT,
+    created_at TEXT,
+    last_activity TEXT,
+    questions_count INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    language TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS sessions_email_nonce ON sessions (email, session_nonce);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    question TEXT,
+    answer TEXT,
+    datetime TEXT,
+    type TEXT,
+    embedding BLOB
+);
+CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class SqliteSessionManager:
+    """SessionManager backed by SQLite in WAL mode, one row per session and per turn.
+
+    Lookups go through the (email, session_nonce) index and adding a turn is a
+    single row insert, instead of rewriting every user's history. Each thread
+    uses its own connection, WAL lets readers run alongside the writer. Turn
+    embeddings are stored as float16 BLOBs and returned base64 encoded, as the
+    JSON backend stores them.
+    """
+
+    def __init__(self, db_path, import_json=None):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+        if import_json:
+            self.import_json(import_json)
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA foreign_keys=ON")
+            self._local.db = db
+        return db
+
+    def import_json(self, json_path):
+        """One-time import of a sessions.json file, skipped once done or if the file is missing."""
+        db = self._connect()
+        if db.execute("SELECT 1 FROM meta WHERE key = 'imported_json'").fetchone():
+            return 0
+        if not os.path.exists(json_path):
+            return 0
+
+        with open(json_path, "r", encoding="utf-8") as file:
+            sessions = json.load(file)
+
+        imported = 0
+        with db:
+            # Workers starting together queue up here, only the first one imports
+            db.execute("BEGIN IMMEDIATE")
+            if db.execute("SELECT 1 FROM meta WHERE key = 'imported_json'").fetchone():
+                return 0
+            for email, user in sessions.items():
+                db.execute("INSERT OR REPLACE INTO users (email, current, last_active) VALUES (?, ?, ?)",
+                           (email, user.get("current"), user.get("last_active")))
+                for stage, stage_data in user.items():
+                    if stage in ["current", "last_active"]:
+                        continue
+                    for session in stage_data.get("General chatbot", []):
+                        cursor = db.execute(
+                            "INSERT OR IGNORE INTO sessions (email, educational_stage, session_nonce, topic, created_at, "
+                            "last_activity, questions_count, total_tokens, language) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (email, stage, session["session_nonce"], session.get("topic"), session.get("created_at"),
+                             session.get("last_activity"), session.get("questions_count", 0),
+                             session.get("total_tokens", 0), session.get("language")))
+                        if not cursor.rowcount:
+                            continue
+                        db.executemany(
+                            "INSERT INTO turns (session_id, question, answer, datetime, type, embedding) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            [(cursor.lastrowid, turn.get("question"), turn.get("answer"), turn.get("datetime"),
+                              turn.get("type"), base64.b64decode(turn["embedding"]) if turn.get("embedding") else None)
+                             for turn in session.get("content", [])])
+                        imported += 1
+            db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('imported_json', ?)", (json_path,))
+
+        print(f"[SessionManager] Imported {imported} sessions from {json_path}")
+        return imported
+
+    def create_session(self, email, educational_stage, topic=None):
+        session_nonce = str(uuid.uuid4())
+        now = datetime.now().strftime(TIME_FORMAT)
+
+        db = self._connect()
+        with db:
+            db.execute(
+                "INSERT INTO users (email, current, last_active) VALUES (?, ?, ?) "
+                "ON CONFLICT (email) DO UPDATE SET last_active = excluded.last_active",
+                (email, educational_stage, now))
+            db.execute(
+                "INSERT INTO sessions (email, educational_stage, session_nonce, topic, created_at, last_activity, "
+                "questions_count, total_tokens, language) VALUES (?, ?, ?, ?, ?, ?, 0, 0, 'ar')",
+                (email, educational_stage, session_nonce, topic, now, now))
+        return session_nonce
+
+    def add_to_session(self, email, educational_stage, session_nonce, question, answer, embedding=None):
+        """Append a turn, storing its embedding (if given) so context never re-encodes it."""
+        now = datetime.now().strftime(TIME_FORMAT)
+        blob = np.asarray(embedding, dtype='float16').tobytes() if embedding is not None else None
+
+        db = self._connect()
+        with db:
+            row = db.execute(
+                "SELECT id FROM sessions WHERE email = ? AND session_nonce = ? AND educational_stage IS ?",
+                (email, session_nonce, educational_stage)).fetchone()
+            if row is None:
+                return False
+            db.execute(
+                "INSERT INTO turns (session_id, question, answer, datetime, type, embedding) VALUES (?, ?, ?, ?, 'chat', ?)",
+                (row["id"], question, answer, now, blob))
+            db.execute(
+                "UPDATE sessions SET last_activity = ?, questions_count = questions_count + 1 WHERE id = ?",
+                (now, row["id"]))
+            db.execute("UPDATE users SET last_active = ? WHERE email = ?", (now, email))
+        return True
+
+    def get_session(self, email, session_nonce):
+        """Get complete session data by nonce."""
+        db = self._connect()
+        session = db.execute(
+            "SELECT * FROM sessions WHERE email = ? AND session_nonce = ?", (email, session_nonce)).fetchone()
+        if session is None:
+            return None
+
+        content = []
+        for turn in db.execute(
+                "SELECT question, answer, datetime, type, embedding FROM turns WHERE session_id = ? ORDER BY id",
+                (session["id"],)):
+            entry = {"question": turn["question"], "answer": turn["answer"],
+                     "datetime": turn["datetime"], "type": turn["type"]}
+            if turn["embedding"] is not None:
+                entry["embedding"] = base64.b64encode(turn["embedding"]).decode('ascii')
+            content.append(entry)
+
+        return {
+            "session_nonce": session["session_nonce"],
+            "topic": session["topic"],
+            "content": content,
+            "created_at": session["created_at"],
+            "last_activity": session["last_activity"],
+            "questions_count": session["questions_count"],
+            "total_tokens": session["total_tokens"],
+            "language": session["language"]
+        }
+
+    def clean_old_sessions(self, days_threshold=30):
+        """Remove sessions older than the specified threshold."""
+        threshold = (datetime.now() - timedelta(days=days_threshold)).strftime(TIME_FORMAT)
+        db = self._connect()
+        with db:
+            db.execute("DELETE FROM sessions WHERE last_activity <= ?", (threshold,))
+
+    def get_user_sessions(self, email):
+        """Get all sessions for a user with metadata."""
+        rows = self._connect().execute(
+            "SELECT s.educational_stage, s.session_nonce, s.topic, s.created_at, s.last_activity, s.questions_count, "
+            "(SELECT question FROM turns t WHERE t.session_id = s.id ORDER BY t.id LIMIT 1) AS first_question "
+            "FROM sessions s WHERE s.email = ? ORDER BY s.educational_stage, s.id", (email,))
+
+        user_sessions = [
+            {
+                "stage": row["educational_stage"],
+                "session_nonce": row["session_nonce"],
+                "topic": row["topic"],
+                "created_at": row["created_at"],
+                "last_activity": row["last_activity"],
+                "questions_count": row["questions_count"],
+                "first_question": row["first_question"] or "New Chat"
+            }
+            for row in rows
+        ]
+
+        print(f"[SessionManager] Returning {len(user_sessions)} sessions")
+        return user_sessions
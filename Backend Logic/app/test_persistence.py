@@ -0,0 +1,78 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import unittest
+
+from app.persistence import JsonFile
+
+
+def increment(path, times):
+    counter = JsonFile(path)
+    for _ in range(times):
+        with counter.update() as data:
+            data["count"] = data.get("count", 0) + 1
+
+
+class JsonFileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "data.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_updates_from_several_processes_are_not_lost(self):
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=increment, args=(self.path, 25)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), {"count": 100})
+
+    def test_read_sees_other_process_writes(self):
+        document = JsonFile(self.path)
+        self.assertEqual(document.read(), {})
+        increment(self.path, 1)
+        self.assertEqual(document.read(), {"count": 1})
+
+    def test_unchanged_update_does_not_rewrite(self):
+        document = JsonFile(self.path)
+        with document.update() as data:
+            data["a"] = 1
+        inode = os.stat(self.path).st_ino
+
+        with document.update() as data:
+            data["a"] = 1
+        self.assertEqual(os.stat(self.path).st_ino, inode)
+
+    def test_read_document_is_never_changed(self):
+        document = JsonFile(self.path)
+        with document.update() as data:
+            data["items"] = [1]
+        held = document.read()
+
+        with document.update() as data:
+            data["items"].append(2)
+        self.assertEqual(held, {"items": [1]})
+        self.assertEqual(document.read(), {"items": [1, 2]})
+
+    def test_failed_update_is_dropped(self):
+        document = JsonFile(self.path)
+        with document.update() as data:
+            data["items"] = [1]
+
+        with self.assertRaises(RuntimeError):
+            with document.update() as data:
+                data["items"].append(2)
+                raise RuntimeError("boom")
+        self.assertEqual(document.read(), {"items": [1]})
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), {"items": [1]})
+
+
+if __name__ == '__main__':
+    unittest.main()
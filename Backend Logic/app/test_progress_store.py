@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+import unittest
+
+from app.progress_store import ProgressStore
+from app.question_set import QuestionSet
+
+
+def as_sets(path, value):
+    """on_load turning every "questions" list into a QuestionSet, like ProgressManager does."""
+    if path and path[-1] == "questions":
+        return QuestionSet(value)
+    if isinstance(value, dict):
+        for key, child in value.items():
+            value[key] = as_sets(list(path) + [key], child)
+    return value
+
+
+class ProgressStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "progress.json")
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        self.tmp.cleanup()
+
+    def store(self):
+        store = ProgressStore(self.path, snapshot_interval=3600, on_load=as_sets)
+        store.load()
+        self.stores.append(store)
+        return store
+
+    def test_journal_is_replayed_on_load(self):
+        writer = self.store()
+        with writer.update() as data:
+            data["a"] = {"total": 1, "questions": QuestionSet(["q1"])}
+            writer.record(["a"], data["a"])
+        with writer.update() as data:
+            data["a"]["total"] = 2
+            writer.record(["a", "total"], 2)
+            data["a"]["questions"].add("q2")
+            writer.record_items(["a", "questions"], added=["q2"])
+
+        self.assertFalse(os.path.exists(self.path))
+        reader = self.store()
+        self.assertEqual(reader.read()["a"]["total"], 2)
+        self.assertEqual(list(reader.read()["a"]["questions"]), ["q1", "q2"])
+
+    def test_other_process_records_are_caught_up(self):
+        first, second = self.store(), self.store()
+        with first.update() as data:
+            data["a"] = {"questions": QuestionSet(["q1", "q2"])}
+            first.record(["a"], data["a"])
+        with second.update() as data:
+            data["a"]["questions"].discard("q1")
+            second.record_items(["a", "questions"], removed=["q1"])
+
+        self.assertEqual(list(first.read()["a"]["questions"]), ["q2"])
+
+    def test_replaying_twice_is_harmless(self):
+        store = self.store()
+        with store.update() as data:
+            data["a"] = {"questions": QuestionSet()}
+            store.record(["a"], data["a"])
+            data["a"]["questions"].add("q1")
+            store.record_items(["a", "questions"], added=["q1"])
+        store._sync()
+
+        with open(store.journal_file, "rb") as f:
+            journal = f.read()
+        with open(store.journal_file, "ab") as f:
+            f.write(journal)
+
+        self.assertEqual(list(self.store().read()["a"]["questions"]), ["q1"])
+
+    def test_compaction_writes_snapshot_and_empties_journal(self):
+        store, other = self.store(), self.store()
+        with store.update() as data:
+            data["a"] = {"total": 3}
+            store.record(["a"], data["a"])
+        store.compact()
+
+        self.assertEqual(os.path.getsize(store.journal_file), 0)
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), {"a": {"total": 3}})
+        # The other store never saw the journal record, it reloads the new snapshot
+        self.assertEqual(other.read(), {"a": {"total": 3}})
+
+    def test_torn_record_is_skipped_and_cut(self):
+        store = self.store()
+        with store.update() as data:
+            data["a"] = 1
+            store.record(["a"], 1)
+        store._sync()
+        with open(store.journal_file, "ab") as f:
+            f.write(b'{"p": ["b"], "v"')
+
+        reloaded = self.store()
+        self.assertEqual(reloaded.read(), {"a": 1})
+        with reloaded.update() as data:
+            data["c"] = 2
+            reloaded.record(["c"], 2)
+        self.assertEqual(self.store().read(), {"a": 1, "c": 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
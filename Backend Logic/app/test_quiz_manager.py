@@ -0,0 +1,68 @@
+import json
+import unittest
+
+from app.quiz_manager import QuizManager, question_errors
+
+
+def question(text, correct=(False, False, True)):
+    return {"question": text, "options": [{"text": f"{text} {i}", "correct": c} for i, c in enumerate(correct)]}
+
+
+class FakeModels:
+    """Answers chat_completion calls with the queued JSON replies, in order."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def chat_completion(self, messages, temperature, response_format=None):
+        self.calls.append(messages)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return json.dumps(reply, ensure_ascii=False)
+
+
+class QuizJsonTestCase(unittest.TestCase):
+    def generate(self, models, num_questions=3):
+        return QuizManager(models)._generate_quiz_json("prompt", "context", num_questions)
+
+    def test_valid_questions_need_one_call(self):
+        models = FakeModels({"questions": [question("q1"), question("q2")]})
+        quiz = self.generate(models)
+
+        self.assertEqual(len(models.calls), 1)
+        self.assertEqual([q["question"] for q in quiz], ["q1", "q2"])
+        self.assertEqual([a["isCorrect"] for a in quiz[0]["answers"]], [0, 0, 1])
+
+    def test_only_invalid_questions_are_repaired(self):
+        broken = question("q2", correct=(True, True, False))
+        self.assertTrue(question_errors(broken))
+        models = FakeModels({"questions": [question("q1"), broken]},
+                            {"questions": [question("q2 fixed")]})
+        quiz = self.generate(models)
+
+        repair_request = json.loads(models.calls[1][1]["content"])
+        self.assertEqual([item["question"] for item in repair_request["questions"]], [broken])
+        self.assertEqual([q["question"] for q in quiz], ["q1", "q2 fixed"])
+        self.assertEqual([q["id"] for q in quiz], [1, 2])
+
+    def test_questions_still_invalid_after_repair_are_dropped(self):
+        models = FakeModels({"questions": [question("q1"), {"question": "q2"}]},
+                            {"questions": [{"question": "q2", "options": []}]})
+        self.assertEqual([q["question"] for q in self.generate(models)], ["q1"])
+
+    def test_failed_repair_keeps_the_valid_questions(self):
+        models = FakeModels({"questions": [question("q1"), {"question": "q2"}]}, RuntimeError("rate limited"))
+        self.assertEqual([q["question"] for q in self.generate(models)], ["q1"])
+
+    def test_extra_questions_are_cut(self):
+        models = FakeModels({"questions": [question(f"q{i}") for i in range(5)]})
+        self.assertEqual(len(self.generate(models, num_questions=3)), 3)
+
+    def test_reply_without_question_list_gives_nothing(self):
+        self.assertEqual(self.generate(FakeModels({"quiz": "nope"})), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from app.quiz_store import QuizStore
+
+QUIZ = [
+    {"id": 1, "question": "q1", "answers": [
+        {"optionLabel": "a", "isCorrect": 1, "index": 0},
+        {"optionLabel": "b", "isCorrect": 0, "index": 1},
+    ]},
+]
+
+
+def pop(path, quiz_id, results):
+    results.put(QuizStore(path).pop(quiz_id) is not None)
+
+
+class QuizStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "quizzes.db")
+        self.store = QuizStore(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_stored_quiz_keeps_stage_level_and_answer_key(self):
+        quiz_id = self.store.put("a@x", "PS5", 2, QUIZ)
+        entry = self.store.get(quiz_id, "a@x")
+        self.assertEqual((entry["educational_stage"], entry["level"]), ("PS5", 2))
+        self.assertEqual(entry["questions"][1]["answers"][0]["isCorrect"], 1)
+        self.assertIsNone(self.store.get(quiz_id, "other@x"))
+
+    def test_first_checked_answer_is_locked(self):
+        quiz_id = self.store.put("a@x", "PS5", 1, QUIZ)
+        self.assertEqual(self.store.lock_answer(quiz_id, 1, 1), 1)
+        self.assertEqual(self.store.lock_answer(quiz_id, 1, 0), 1)
+        self.assertEqual(self.store.pop(quiz_id)["locked"], {1: 1})
+
+    def test_nothing_is_locked_once_the_quiz_is_gone(self):
+        quiz_id = self.store.put("a@x", "PS5", 1, QUIZ)
+        self.store.pop(quiz_id)
+        self.assertIsNone(self.store.lock_answer(quiz_id, 1, 0))
+        self.assertIsNone(self.store.pop(quiz_id))
+
+    def test_only_one_process_pops_a_quiz(self):
+        quiz_id = self.store.put("a@x", "PS5", 1, QUIZ)
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        workers = [context.Process(target=pop, args=(self.path, quiz_id, results)) for _ in range(6)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(sorted(results.get() for _ in workers), [False] * 5 + [True])
+
+    def test_expired_quiz_is_gone(self):
+        store = QuizStore(self.path, ttl=60)
+        quiz_id = store.put("a@x", "PS5", 1, QUIZ)
+        with mock.patch("app.quiz_store.time.time", return_value=time.time() + 61):
+            self.assertIsNone(store.get(quiz_id))
+            self.assertIsNone(store.pop(quiz_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from app.response_cache import ResponseCache, response_key
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "responses.db")
+        self.cache = ResponseCache(self.path, max_size=10, disk_size=100, ttl=60)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def later(self, seconds):
+        return mock.patch("app.response_cache.time.time", return_value=time.time() + seconds)
+
+    def test_key_ignores_trivial_differences(self):
+        self.assertEqual(response_key("ما هي الثورة؟ ", "PS5"), response_key("ما  هي الثورة", "PS5"))
+        self.assertNotEqual(response_key("ما هي الثورة", "PS5"), response_key("ما هي الثورة", "PS6"))
+
+    def test_answer_is_served_until_it_expires(self):
+        self.cache.put("k", "answer")
+        with self.later(30):
+            self.assertEqual(self.cache.get("k"), "answer")
+        with self.later(61):
+            self.assertIsNone(self.cache.get("k"))
+
+    def test_expired_answer_on_disk_is_a_miss(self):
+        self.cache.put("k", "answer")
+        restarted = ResponseCache(self.path, max_size=10, disk_size=100, ttl=60)
+        self.assertEqual(restarted.get("k"), "answer")
+        self.assertEqual(restarted.disk_hits, 1)
+
+        restarted = ResponseCache(self.path, max_size=10, disk_size=100, ttl=60)
+        with self.later(61):
+            self.assertIsNone(restarted.get("k"))
+        self.assertEqual(restarted.misses, 1)
+
+    def test_prune_drops_expired_answers(self):
+        self.cache.put("old", "answer")
+        with self.later(61):
+            for i in range(ResponseCache.PRUNE_EVERY):
+                self.cache.put(f"new{i}", "answer")
+        self.assertEqual(self.cache.stats()["disk_size"], ResponseCache.PRUNE_EVERY)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,34 +1,24 @@
-import json
-import os
 from typing import Dict, Optional
 import re
 from datetime import datetime
 
+from .persistence import JsonFile
+
 class TopicManager:
     def __init__(self, ml_manager):
         self.ml_manager = ml_manager
         self.cache_file = "topic_cache.json"
-        self.cache = self._load_cache()
+        # Shared with the other worker processes, reloaded when one of them adds a topic
+        self.cache = JsonFile(self.cache_file, indent=2)
 
     def _load_cache(self) -> dict:
-        """Load the cache from file or create new if doesn't exist"""
+        """The cache as last saved by any worker, empty if it cannot be read"""
         try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {}
+            return self.cache.read()
         except Exception as e:
             print(f"Error loading cache: {e}")
             return {}
 
-    def _save_cache(self):
-        """Save the current cache to file"""
-        try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Error saving cache: {e}")
-
     def _get_cache_key(self, educational_stage: str, topic: str) -> str:
         """Generate a unique cache key"""
         return f"{educational_stage}:{topic}"
@@ -36,8 +26,9 @@ class TopicManager:
     def _get_from_cache(self, educational_stage: str, topic: str) -> Optional[str]:
         """Retrieve content from cache if exists"""
         cache_key = self._get_cache_key(educational_stage, topic)
-        if (cache_key in self.cache):
-            cache_entry = self.cache[cache_key]
+        cache = self._load_cache()
+        if (cache_key in cache):
+            cache_entry = cache[cache_key]
             # Add timestamp check if you want to expire cache after certain time
             # timestamp = datetime.fromisoformat(cache_entry['timestamp'])
             # if (datetime.now() - timestamp).days > 7:  # Expire after 7 days
@@ -48,11 +39,14 @@ class TopicManager:
     def _add_to_cache(self, educational_stage: str, topic: str, content: str):
         """Add enhanced content to cache"""
         cache_key = self._get_cache_key(educational_stage, topic)
-        self.cache[cache_key] = {
-            'content': content,
-            'timestamp': datetime.now().isoformat(),
-        }
-        self._save_cache()
+        try:
+            with self.cache.update() as cache:
+                cache[cache_key] = {
+                    'content': content,
+                    'timestamp': datetime.now().isoformat(),
+                }
+        except Exception as e:
+            print(f"Error saving cache: {e}")
 
     def _parse_markdown_content(self, raw_content: str) -> str:
         """Extract and clean the actual markdown content from LLM response"""
@@ -1,44 +1,66 @@
-import json
 import hashlib
 from datetime import datetime
 
+from .persistence import JsonFile
+
 
 class UserManager:
-    def __init__(self, users_file_path):
-        self.users_file_path = users_file_path
+    """Users kept in memory as an email -> record index over users.json.
 
-    def _read_users(self):
-        try:
-            with open(self.users_file_path, "r", encoding="utf-8") as file:
-                return json.load(file)
-        except FileNotFoundError:
-            return {}
+    The file is only parsed again when another process changed it, and is
+    written atomically under a lock shared by all worker processes, see
+    JsonFile.
+    """
 
-    def _write_users(self, data):
-        with open(self.users_file_path, "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=4)
+    def __init__(self, users_file_path):
+        self.users_file_path = users_file_path
+        self.users = JsonFile(users_file_path)
 
     def _hash_password(self, password):
         return hashlib.sha256(password.encode()).hexdigest()
 
-    def create_user(self, email, password, firstname, educational_level):
-        users = self._read_users()
-
-        if email in users:
-            return False, "Email already exists"
-
-        users[email] = {
+    def _new_user(self, password, firstname, educational_level):
+        return {
             "firstname": firstname,
             "password": self._hash_password(password),
             "educational_level": educational_level,
             "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
 
-        self._write_users(users)
+    def create_user(self, email, password, firstname, educational_level):
+        if email in self.users.read():
+            return False, "Email already exists"
+
+        with self.users.update() as users:
+            if email in users:
+                return False, "Email already exists"
+
+            users[email] = self._new_user(password, firstname, educational_level)
         return True, "User created successfully"
 
+    def import_users(self, records):
+        """Create every user of a roster with a single write.
+
+        records are dicts with email, password, firstname and educational_level.
+        Returns the number of users created and the records skipped, with why.
+        """
+        created = 0
+        skipped = []
+        with self.users.update() as users:
+            for record in records:
+                email = record.get("email")
+                if not all(record.get(field) for field in ["email", "password", "firstname", "educational_level"]):
+                    skipped.append((record, "Missing required fields"))
+                    continue
+                if email in users:
+                    skipped.append((record, "Email already exists"))
+                    continue
+                users[email] = self._new_user(record["password"], record["firstname"], record["educational_level"])
+                created += 1
+        return created, skipped
+
     def verify_user(self, email, password):
-        users = self._read_users()
+        users = self.users.read()
 
         if email not in users:
             return False, "User not found"
@@ -53,7 +75,7 @@ class UserManager:
         }
 
     def get_user(self, email):
-        users = self._read_users()
+        users = self.users.read()
         user = users.get(email)
         if user:
             return {
@@ -64,15 +86,16 @@ class UserManager:
         return None
 
     def update_user(self, email, firstname, educational_level):
-        users = self._read_users()
-
-        if email not in users:
+        if email not in self.users.read():
             return False, "User not found"
 
-        users[email]["firstname"] = firstname
-        users[email]["educational_level"] = educational_level
-        
-        self._write_users(users)
+        with self.users.update() as users:
+            # Removed by another process since the check above
+            if email not in users:
+                return False, "User not found"
+
+            users[email]["firstname"] = firstname
+            users[email]["educational_level"] = educational_level
 
         # return the user data
         return {
@@ -80,4 +103,3 @@ class UserManager:
             "email": email,
             "educational_level": educational_level
         }
-
@@ -0,0 +1,120 @@
+import faiss
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+from .config import Config
+
+INDEX_TYPES = ('flat', 'hnsw', 'ivf')
+
+
+def make_faiss_index(vectors: np.ndarray, index_type: str = 'flat'):
+    """Create and fill an inner-product index of the given type over normalized vectors."""
+    dimension = vectors.shape[1]
+    if index_type == 'flat':
+        index = faiss.IndexFlatIP(dimension)
+    elif index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, Config.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = Config.HNSW_EF_CONSTRUCTION
+    elif index_type == 'ivf':
+        # Keep ~39 training points per list, as faiss recommends
+        nlist = max(1, min(Config.IVF_NLIST, len(vectors) // 39))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dimension), dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+    else:
+        raise ValueError(f"Unknown index type: {index_type}, expected one of {INDEX_TYPES}")
+    index.add(vectors)
+    return index
+
+
+def search_parameters(index, selector, ef_search: int = None, nprobe: int = None):
+    """Search parameters for the index type, restricted to the selected ids."""
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search or Config.HNSW_EF_SEARCH)
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe or Config.IVF_NPROBE)
+    return faiss.SearchParameters(sel=selector)
+
+
+class VectorIndex:
+    """Prebuilt inner-product index over the corpus, partitioned by stage and era.
+
+    Rows are stored sorted by (EducationalStage, HistoricalEra) so every
+    partition is a contiguous range of index ids, and a query only scans the
+    range of its partition. The index is exact (flat) or approximate
+    (HNSW / IVF) depending on Config.CHAT_INDEX_TYPE. `ids` maps an index id back to the row position
+    in the DataFrame the index was built from.
+    """
+
+    def __init__(self, index, ids: np.ndarray, partitions: Dict[Tuple, Tuple[int, int]],
+                 ef_search: int = None, nprobe: int = None):
+        self.index = index
+        self.ids = ids
+        self.partitions = partitions
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+
+    @staticmethod
+    def normalize(vectors) -> np.ndarray:
+        vectors = np.array(vectors, dtype='float32', ndmin=2)
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    @classmethod
+    def build(cls, data: pd.DataFrame, index_type: str = None) -> 'VectorIndex':
+        """Build the index from a DataFrame with Content and Embeddings columns."""
+        positions = np.flatnonzero(data['Content'].notnull().to_numpy())
+        rows = data.iloc[positions]
+
+        # Stable sort keeps the original row order inside each partition. A missing stage or era
+        # becomes '' (astype(str) keeps NaN under pandas 3), such rows are only found stage-wide
+        keys = list(zip(rows['EducationalStage'].fillna('').astype(str),
+                        rows['HistoricalEra'].fillna('').astype(str)))
+        order = sorted(range(len(keys)), key=lambda i: keys[i])
+        ids = positions[order]
+
+        partitions = {}
+        for start, i in enumerate(order):
+            stage, era = keys[i]
+            for key in ((stage, era), (stage, None)):
+                first, _ = partitions.get(key, (start, start))
+                partitions[key] = (first, start + 1)
+
+        vectors = cls.normalize(np.vstack(rows['Embeddings'].to_numpy())[order])
+        index = make_faiss_index(vectors, index_type or Config.CHAT_INDEX_TYPE)
+        return cls(index, ids, partitions)
+
+    def get_selector(self, educational_stage: Optional[str] = None, historical_era: Optional[str] = None):
+        """Return (selector, size) for the ids a query may match, or None if nothing matches."""
+        if not historical_era or historical_era == 'None':
+            historical_era = None
+
+        if educational_stage:
+            ranges = [self.partitions.get((educational_stage, historical_era))]
+        elif historical_era:
+            ranges = [r for (_, era), r in self.partitions.items() if era == historical_era]
+        else:
+            ranges = [(0, self.index.ntotal)]
+
+        ranges = [r for r in ranges if r and r[1] > r[0]]
+        if not ranges:
+            return None
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            return faiss.IDSelectorRange(start, end), end - start
+
+        ids = np.concatenate([np.arange(start, end) for start, end in ranges]).astype('int64')
+        return faiss.IDSelectorBatch(ids), len(ids)
+
+    def search(self, query_embedding, educational_stage: Optional[str] = None,
+               historical_era: Optional[str] = None, k: int = 20) -> List[Tuple[int, float]]:
+        """Search one partition, returning (row position, similarity) pairs best first."""
+        selection = self.get_selector(educational_stage, historical_era)
+        if selection is None:
+            return []
+
+        selector, size = selection
+        params = search_parameters(self.index, selector, self.ef_search, self.nprobe)
+        D, I = self.index.search(self.normalize(query_embedding), min(k, size), params=params)
+
+        return [(int(self.ids[i]), float(d)) for i, d in zip(I[0], D[0]) if i >= 0]
@@ -0,0 +1,154 @@
+"""Latency of ProgressManager.update_progress_batch for a student with many answered questions.
+
+Compares the set-based level state against the original list-based update,
+kept here as the baseline. Both are timed in memory, without the progress
+store. The stored column times the same set-based update through a real
+write-behind progress store in a temporary directory, with its locks and
+journal writes, and journal is the bytes it appended per submission, which
+should not grow with the number of answered questions. Run from the
+backend root:
+
+    python -m benchmarks.progress --answered 100 1000 5000 20000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+from app.config import Config
+from app.progress_manager import ProgressManager
+
+EMAIL = "student@example.com"
+STAGE = "Primary"
+LEVEL = 1
+
+
+def list_update(level_data, answers, max_history=10):
+    """The list-based update_progress_batch body the set-based one replaced."""
+    timestamp = datetime.now().isoformat()
+    results = []
+    for question, is_correct in answers:
+        if is_correct:
+            if question in level_data["incorrect_questions"]:
+                level_data["incorrect_questions"].remove(question)
+                level_data["total_incorrect"] -= 1
+            if question not in level_data["answered_questions"]:
+                level_data["answered_questions"].append(question)
+                level_data["total_correct"] += 1
+        else:
+            if question not in level_data["incorrect_questions"]:
+                level_data["incorrect_questions"].append(question)
+                level_data["total_incorrect"] += 1
+        level_data['total_questions_seen'] += 1
+        level_data["quiz_history"].insert(0, {
+            "question": question, "correct": is_correct, "timestamp": timestamp, "level": LEVEL})
+        results.append({
+            "progress": ProgressManager._level_progress(level_data),
+            "total_correct": level_data["total_correct"],
+            "total_incorrect": level_data["total_incorrect"],
+            "incorrect_questions": list(level_data["incorrect_questions"]),
+            "total_questions_seen": level_data["total_questions_seen"]
+        })
+    level_data["quiz_history"] = level_data["quiz_history"][:max_history]
+    return results
+
+
+class MemoryStore:
+    """Stands in for the progress store, so update_progress_batch only changes the dicts."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+    @contextmanager
+    def update(self):
+        yield self.data
+
+    def record(self, path, value):
+        pass
+
+    def record_items(self, path, added=(), removed=()):
+        pass
+
+
+def stored_level(n):
+    """A level as stored on disk after n correct and n // 10 incorrect answers."""
+    return {
+        "progress": 100,
+        "answered_questions": [f"Answered question number {i}?" for i in range(n)],
+        "incorrect_questions": [f"Missed question number {i}?" for i in range(n // 10)],
+        "total_correct": n,
+        "total_incorrect": n // 10,
+        "total_questions_seen": n + n // 10,
+        "quiz_history": [],
+    }
+
+
+def submission(n, rng, size=5):
+    """A quiz submission mixing new, already answered and previously missed questions."""
+    answers = []
+    for i in range(size):
+        kind = rng.integers(3)
+        if kind == 0:
+            question = f"New question {rng.integers(1 << 30)}?"
+        elif kind == 1:
+            question = f"Answered question number {rng.integers(max(n, 1))}?"
+        else:
+            question = f"Missed question number {rng.integers(max(n // 10, 1))}?"
+        answers.append((question, bool(rng.integers(2))))
+    return answers
+
+
+def time_ms(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.median(latencies)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--answered', type=int, nargs='*', default=[100, 1000, 5000, 20000])
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    Config.PROGRESS_WRITE_BEHIND = True
+    # No compaction while timing, the journal then holds exactly what the submissions appended
+    Config.PROGRESS_SNAPSHOT_INTERVAL = float('inf')
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.answered:
+            level_data = stored_level(n)
+            progress_file = os.path.join(tmp, f"progress_{n}.json")
+            with open(progress_file, 'w', encoding='utf-8') as f:
+                json.dump({EMAIL: {STAGE: {str(LEVEL): stored_level(n)}}}, f)
+            progress_manager = ProgressManager(progress_file, embeddings_file=os.path.join(tmp, f"embeddings_{n}.db"))
+            store = progress_manager.store
+
+            def submissions():
+                # Generated up front so only the update is timed
+                return iter([submission(n, rng) for _ in range(args.repeat)])
+
+            def sets_update(answers):
+                return lambda: progress_manager.update_progress_batch(EMAIL, STAGE, LEVEL, next(answers))
+
+            answers = submissions()
+            lists = time_ms(lambda: list_update(level_data, next(answers)), args.repeat)
+            progress_manager.store = MemoryStore(store.read())
+            sets = time_ms(sets_update(submissions()), args.repeat)
+            progress_manager.store = store
+            stored = time_ms(sets_update(submissions()), args.repeat)
+            journal = os.path.getsize(store.journal_file) / args.repeat
+            print(f"answered={n:<6} lists={lists:8.3f}ms  sets={sets:7.3f}ms  speedup={lists / sets:6.1f}x  "
+                  f"stored={stored:7.3f}ms  journal={journal:6.0f}B/submit")
+            store.close()
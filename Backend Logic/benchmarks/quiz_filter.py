@@ -0,0 +1,84 @@
+"""Latency of QuizManager.filter_similar_content as the number of answered questions grows.
+
+Compares the vectorized filter against the original per-row loop over
+calculate_similarity, on one (stage, level) block of the corpus with random
+corpus rows standing in for answered-question embeddings. Run from the
+backend root:
+
+    python -m benchmarks.quiz_filter --answered 0 10 50 200 1000
+"""
+import argparse
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.config import Config
+from app.quiz_manager import QuizManager
+
+
+class CorpusSource:
+    """Provides the corpus to QuizManager without loading the transformer or Groq client."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def get_data(self):
+        return self.data
+
+
+def loop_filter(quiz_manager, level, educational_stage, answered_embeddings, max_rows=25):
+    """The iterrows implementation filter_similar_content replaced, kept as the baseline."""
+    data = quiz_manager.ml_manager.get_data()
+    relevant_data = data[(data['EducationalStage'] == educational_stage) & (data['Level'] == level)]
+    if relevant_data.empty:
+        relevant_data = data[data['EducationalStage'] == educational_stage]
+
+    filtered_data = []
+    relevant_data = relevant_data.sample(frac=1).reset_index(drop=True)
+    for _, row in relevant_data.iterrows():
+        max_similarity = -1
+        for answered_embedding in answered_embeddings:
+            similarity = quiz_manager.calculate_similarity(np.array(row['Embeddings']), answered_embedding)
+            max_similarity = max(max_similarity, similarity)
+        if max_similarity < quiz_manager.similarity_threshold:
+            filtered_data.append(row)
+        if len(filtered_data) >= max_rows:
+            break
+    return pd.DataFrame(filtered_data)
+
+
+def time_ms(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.median(latencies)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', default=Config.EMBEDDINGS_FILE, help="embeddings pickle")
+    parser.add_argument('--stage', help="educational stage, defaults to the largest one")
+    parser.add_argument('--level', type=int, default=1)
+    parser.add_argument('--answered', type=int, nargs='*', default=[0, 10, 50, 200, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.source, 'rb') as f:
+        data = pickle.load(f)
+    stage = args.stage or data['EducationalStage'].value_counts().index[0]
+
+    quiz_manager = QuizManager(CorpusSource(data))
+    quiz_manager._content_block(args.level, stage)  # built once per server, not per quiz
+    rng = np.random.default_rng(args.seed)
+    print(f"stage={stage} level={args.level} rows={len(quiz_manager._content_block(args.level, stage)[0])}")
+
+    for n in args.answered:
+        answered = [data['Embeddings'].iloc[i] for i in rng.integers(0, len(data), size=n)]
+        loop = time_ms(lambda: loop_filter(quiz_manager, args.level, stage, answered), args.repeat)
+        vectorized = time_ms(lambda: quiz_manager.filter_similar_content(args.level, stage, answered), args.repeat)
+        print(f"answered={n:<6} loop={loop:9.2f}ms  vectorized={vectorized:7.2f}ms  speedup={loop / vectorized:6.1f}x")
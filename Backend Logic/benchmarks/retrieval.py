@@ -0,0 +1,73 @@
+"""Recall@k and latency of approximate chat retriever indexes against the flat index.
+
+Queries are corpus embeddings searched inside their own educational stage
+partition, the same way relevantContent searches. Run from the backend root:
+
+    python -m benchmarks.retrieval --k 20 --ef-search 16 32 64 --nprobe 1 4 8
+"""
+import argparse
+import pickle
+import time
+
+import numpy as np
+
+from app.config import Config
+from app.vector_index import VectorIndex
+
+
+def run_queries(vector_index, queries, stages, k):
+    """Search every query in its stage partition, returning hit ids and latencies in ms."""
+    results, latencies = [], []
+    for query, stage in zip(queries, stages):
+        start = time.perf_counter()
+        hits = vector_index.search(query, stage, k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([idx for idx, _ in hits])
+    return results, np.array(latencies)
+
+
+def recall_at_k(results, ground_truth):
+    found = sum(len(set(r) & set(t)) for r, t in zip(results, ground_truth))
+    return found / max(1, sum(len(t) for t in ground_truth))
+
+
+def report(name, results, latencies, ground_truth):
+    print(f"{name:<24} recall@k={recall_at_k(results, ground_truth):.4f}  "
+          f"p50={np.percentile(latencies, 50):.3f}ms  p99={np.percentile(latencies, 99):.3f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', default=Config.EMBEDDINGS_FILE, help="embeddings pickle")
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=500, help="number of sampled query rows")
+    parser.add_argument('--ef-search', type=int, nargs='*', default=[16, 32, 64, 128])
+    parser.add_argument('--nprobe', type=int, nargs='*', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.source, 'rb') as f:
+        data = pickle.load(f)
+    data = data.dropna(subset=['Content'])
+
+    rng = np.random.default_rng(args.seed)
+    sample = rng.choice(len(data), size=min(args.queries, len(data)), replace=False)
+    queries = np.vstack(data['Embeddings'].iloc[sample].to_numpy()).astype('float32')
+    stages = data['EducationalStage'].iloc[sample].tolist()
+    print(f"{len(data)} vectors, {len(queries)} queries, k={args.k}")
+
+    flat = VectorIndex.build(data, 'flat')
+    ground_truth, latencies = run_queries(flat, queries, stages, args.k)
+    report("flat", ground_truth, latencies, ground_truth)
+
+    hnsw = VectorIndex.build(data, 'hnsw')
+    for ef_search in args.ef_search:
+        hnsw.ef_search = ef_search
+        results, latencies = run_queries(hnsw, queries, stages, args.k)
+        report(f"hnsw efSearch={ef_search}", results, latencies, ground_truth)
+
+    ivf = VectorIndex.build(data, 'ivf')
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        results, latencies = run_queries(ivf, queries, stages, args.k)
+        report(f"ivf nlist={ivf.index.nlist} nprobe={nprobe}", results, latencies, ground_truth)
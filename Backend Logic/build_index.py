@@ -0,0 +1,27 @@
+import argparse
+import pickle
+
+from sentence_transformers import SentenceTransformer
+
+from app.config import Config
+from app.index_store import build_index_files, file_sha256, load_index_files
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Build the FAISS index artifact next to the embeddings pickle.")
+    parser.add_argument('--source', default=Config.EMBEDDINGS_FILE,
+                        help="embeddings pickle to index")
+    parser.add_argument('--force', action='store_true',
+                        help="rebuild even if the artifact matches the source hash")
+    args = parser.parse_args()
+
+    source_hash = file_sha256(args.source)
+    if not args.force and load_index_files(source_hash) is not None:
+        print(f"FAISS index is up to date with {args.source}")
+    else:
+        with open(args.source, 'rb') as f:
+            data = pickle.load(f)
+        # Passages are embedded with the same model the chat encodes questions with
+        model = SentenceTransformer(Config.LOCAL_MODEL_PATH, trust_remote_code=True)
+        vector_index, passages, _ = build_index_files(data, source_hash, model.encode)
+        print(f"Wrote {vector_index.index.ntotal} passages from {len(data)} rows to {Config.FAISS_INDEX_FILE}")
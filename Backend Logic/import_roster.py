@@ -0,0 +1,35 @@
+import argparse
+import csv
+import json
+
+from app.user_manager import UserManager
+
+FIELDS = ["email", "password", "firstname", "educational_level"]
+
+
+def read_roster(path):
+    """Read roster records from a CSV file with a header row, or a JSON list of objects."""
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return [{field: (row.get(field) or "").strip() for field in FIELDS} for row in csv.DictReader(f)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Create the accounts of a whole roster in users.json with a single write.")
+    parser.add_argument('roster', help="CSV (header: email,password,firstname,educational_level) or JSON file")
+    parser.add_argument('--users-file', default="users.json", help="users file the server reads")
+    parser.add_argument('--educational-level', help="educational level for rows that do not set one")
+    args = parser.parse_args()
+
+    records = read_roster(args.roster)
+    if args.educational_level:
+        for record in records:
+            record["educational_level"] = record.get("educational_level") or args.educational_level
+
+    created, skipped = UserManager(args.users_file).import_users(records)
+    for record, reason in skipped:
+        print(f"Skipped {record.get('email') or record}: {reason}")
+    print(f"Imported {created} of {len(records)} users into {args.users_file}")
@@ -0,0 +1,104 @@
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from app.config import Config
+from app.question_bank import QuestionBank
+
+# Corpus columns QuizManager picks quiz content from
+DATA_COLUMNS = ['EducationalStage', 'Level', 'Topic', 'Content', 'Embeddings']
+
+# Per-process state, set up once by init_worker
+_models = None
+_quiz_manager = None
+
+
+class BankBatch:
+    """Stands in for QuestionBank in worker processes, collecting what QuizManager would insert."""
+
+    def __init__(self):
+        self.items = []
+
+    def add(self, educational_stage, level, questions, embeddings, topic=None):
+        self.items.append((educational_stage, level, questions, embeddings, topic))
+        return len(questions)
+
+
+def init_worker(data):
+    """Load the embedding model and Groq client only, not the chat index and caches MLManager also sets up."""
+    global _models, _quiz_manager
+    from app.ml_manager import ModelClients
+    from app.quiz_manager import QuizManager
+    _models = ModelClients(data)
+    _quiz_manager = QuizManager(_models)
+
+
+def generate_batch(educational_stage, level, num_questions):
+    """Generate one quiz with the server's QuizManager, returning the questions to bank."""
+    _quiz_manager.question_bank = BankBatch()
+    _quiz_manager.generate_quiz(educational_stage, level, [], num_questions=num_questions)
+    return _quiz_manager.question_bank.items
+
+
+def encode_batch(educational_stage, level, questions):
+    """Embed already-generated questions, e.g. from the old quiz_cache.json."""
+    embeddings = _models.encode_texts([q['question'] for q in questions], cache=False)
+    return [(educational_stage, level, questions, embeddings, None)]
+
+
+def legacy_quizzes(path):
+    """Yield (stage, level, questions) from a quiz_cache.json style file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        cache = json.load(f)
+    for stages in cache.values():
+        for stage, levels in stages.items():
+            for level, entry in levels.items():
+                yield stage, int(level), entry.get('quiz', [])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Pre-fill the quiz question bank for every educational stage and level.")
+    parser.add_argument('--source', default=Config.EMBEDDINGS_FILE,
+                        help="embeddings pickle the quizzes are generated from")
+    parser.add_argument('--stages', nargs='*', help="educational stages, defaults to all in the data")
+    parser.add_argument('--levels', type=int, nargs='*', default=[1, 2, 3])
+    parser.add_argument('--quizzes', type=int, default=5, help="quizzes to generate per stage and level")
+    parser.add_argument('--num-questions', type=int, default=Config.QUIZ_POOL_QUESTIONS)
+    parser.add_argument('--workers', type=int, default=Config.MAX_WORKERS,
+                        help="worker processes, each loads its own embedding model")
+    parser.add_argument('--import-json', help="also bank the questions of a quiz_cache.json style file")
+    args = parser.parse_args()
+
+    data = pd.read_pickle(args.source)
+    data = data[[column for column in DATA_COLUMNS if column in data.columns]]
+    stages = args.stages or sorted(data['EducationalStage'].dropna().unique())
+    bank = QuestionBank()
+
+    # Download the model here once rather than in every worker at the same time
+    from app.ml_manager import download_embedding_model
+    download_embedding_model()
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(data,)) as executor:
+        futures = [
+            executor.submit(generate_batch, stage, level, args.num_questions)
+            for stage in stages for level in args.levels for _ in range(args.quizzes)
+        ]
+        if args.import_json:
+            futures += [executor.submit(encode_batch, stage, level, questions)
+                        for stage, level, questions in legacy_quizzes(args.import_json) if questions]
+
+        # Only this process writes to the bank, so duplicates across workers are caught too
+        inserted = 0
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                for stage, level, questions, embeddings, topic in future.result():
+                    inserted += bank.add(stage, level, questions, embeddings, topic)
+            except Exception as e:
+                print(f"Batch failed: {e}")
+            print(f"{done}/{len(futures)} batches, {inserted} questions banked")
+
+    for key, count in sorted(bank.stats().items()):
+        print(f"{key}: {count} questions")
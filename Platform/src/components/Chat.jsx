@@ -11,7 +11,6 @@ function Chat({
   const [isFirstMessageSent, setIsFirstMessageSent] = useState(false);
   const [streamingText, setStreamingText] = useState("");
   const [isStreaming, setIsStreaming] = useState(false);
-  const [streamingMessageId, setStreamingMessageId] = useState(null);
   const [sessionNonce, setSessionNonce] = useState(null);
   const [userData, setUserData] = useState(null);
   const [isWaitingForResponse, setIsWaitingForResponse] = useState(false);
@@ -88,35 +87,53 @@ function Chat({
     loadContent();
   }, [session, userData]);
 
-  const streamBotMessage = (fullText) => {
+  // Reads the Server-Sent Events of /ask/stream, showing tokens as they arrive
+  const readAnswerStream = async (response) => {
     setIsStreaming(true); // Disable user input while streaming
     setStreamingText(""); // Reset streaming text
-    let index = 0;
 
-    const messageId = Date.now(); // Unique ID for each streaming message
-    setStreamingMessageId(messageId);
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let fullText = "";
 
-    const interval = setInterval(() => {
-      if (index < fullText.length) {
-        setStreamingText((prev) => prev + fullText[index]);
-        index++;
-      } else {
-        clearInterval(interval);
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
 
-        setMessages((prevMessages) => {
-          const filteredMessages = prevMessages.filter(
-            (msg) => msg.id !== messageId
-          );
-          return [
-            ...filteredMessages,
-            { id: messageId, sender: "bot", text: fullText },
-          ];
-        });
-
-        setIsStreaming(false);
-        setStreamingText("");
+      const events = buffer.split("\n\n");
+      buffer = events.pop();
+      for (const rawEvent of events) {
+        let event = "message";
+        let data = "";
+        for (const line of rawEvent.split("\n")) {
+          if (line.startsWith("event: ")) event = line.slice(7);
+          else if (line.startsWith("data: ")) data += line.slice(6);
+        }
+        if (!data) continue;
+        const payload = JSON.parse(data);
+
+        if (event === "session") {
+          setSessionNonce(payload.session_nonce);
+        } else if (event === "error") {
+          throw new Error(payload.error);
+        } else if (event === "done") {
+          fullText = payload.answer;
+        } else if (payload.token) {
+          setIsWaitingForResponse(false);
+          fullText += payload.token;
+          setStreamingText((prev) => prev + payload.token);
+        }
       }
-    }, 30); // 50ms delay for each character
+    }
+
+    setMessages((prevMessages) => [
+      ...prevMessages,
+      { id: Date.now(), sender: "bot", text: fullText || "عذراً، حدث خطأ في معالجة طلبك." },
+    ]);
+    setIsStreaming(false);
+    setStreamingText("");
   };
 
   const handleAddMessage = (sender, text) => {
@@ -139,7 +156,7 @@ function Chat({
     setIsWaitingForResponse(true); // Start loading
 
     try {
-      const response = await fetch("http://localhost:5000/ask", {
+      const response = await fetch("http://localhost:5000/ask/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
@@ -153,12 +170,7 @@ function Chat({
       });
 
       if (response.ok) {
-        const data = await response.json();
-        if (data.session_nonce) {
-          setSessionNonce(data.session_nonce);
-        }
-        const botMessage = data.answer || "عذراً، حدث خطأ في معالجة طلبك.";
-        streamBotMessage(botMessage);
+        await readAnswerStream(response);
       } else {
         throw new Error("Failed to fetch response");
       }
@@ -166,6 +178,7 @@ function Chat({
       console.error("Error:", error);
       handleAddMessage("bot", "عذراً، حدث خطأ في معالجة طلبك.");
       setIsStreaming(false);
+      setStreamingText("");
     } finally {
       setIsWaitingForResponse(false); // Stop loading
     }
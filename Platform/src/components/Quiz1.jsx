@@ -5,6 +5,7 @@ import { useNavigate, useLocation } from "react-router-dom";
 
 function Quiz1() {
   const [questions, setQuestions] = useState([]);
+  const [quizId, setQuizId] = useState(null);
   const [currentQuestionIndex, setCurrentQuestionIndex] = useState(0);
   const [score, setScore] = useState(0);
   const [quizCompleted, setQuizCompleted] = useState(false);
@@ -48,7 +49,6 @@ function Quiz1() {
             educational_stage: userData.educational_level,
             level: selectedLevel, // Use the selected level here
             num_questions: 5,
-            use_cache: false,
           }),
         });
 
@@ -58,14 +58,15 @@ function Quiz1() {
 
         const data = await response.json();
         console.log(data);
+        // The answer key stays on the server, `correct` is filled in once a question is checked
         const formattedQuestions = data.quiz.map((q) => ({
           id: q.id,
           question: q.question,
           options: q.answers.map((answer) => answer.optionLabel),
-          correct: q.answers.find((answer) => answer.isCorrect === 1)
-            ?.optionLabel,
+          correct: null,
           answers: q.answers,
         }));
+        setQuizId(data.quiz_id);
         setQuestions(formattedQuestions);
       } catch (error) {
         console.error("Error fetching quiz:", error);
@@ -75,7 +76,23 @@ function Quiz1() {
     fetchQuiz();
   }, [selectedLevel, userData, quizKey]); // Add quizKey as dependency
 
-  const handleAnswer = (selectedOption, selectedIndex) => {
+  // Grades one answer on the server, which also locks it for the submission
+  const checkAnswer = async (questionId, selectedIndex) => {
+    const response = await fetch("http://localhost:5000/quiz/check", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        email: userData.email,
+        quiz_id: quizId,
+        question_id: questionId,
+        selected_option: selectedIndex,
+      }),
+    });
+    if (!response.ok) throw new Error("Failed to check answer");
+    return response.json();
+  };
+
+  const handleAnswer = async (selectedOption, selectedIndex) => {
     const currentQuestion = questions[currentQuestionIndex];
     if (!answeredQuestions.includes(currentQuestionIndex)) {
       setAnsweredQuestions((prev) => [...prev, currentQuestionIndex]);
@@ -86,7 +103,19 @@ function Quiz1() {
         [currentQuestion.id]: selectedIndex,
       }));
 
-      if (selectedOption === currentQuestion.correct) {
+      let result = { correct: false, correct_option: null };
+      try {
+        result = await checkAnswer(currentQuestion.id, selectedIndex);
+      } catch (error) {
+        console.error("Error checking answer:", error);
+      }
+
+      const correctLabel = currentQuestion.options[result.correct_option] ?? null;
+      setQuestions((prev) =>
+        prev.map((q) => (q.id === currentQuestion.id ? { ...q, correct: correctLabel } : q))
+      );
+
+      if (result.correct) {
         setScore((prevScore) => prevScore + 1);
         setFeedback("إجابة صحيحة! 🎉");
       } else {
@@ -151,12 +180,8 @@ function Quiz1() {
       email: userData.email,
       educational_stage: userData.educational_level,
       level: selectedLevel,
+      quiz_id: quizId,
       answers: formattedAnswers,
-      quiz_data: questions.map((q) => ({
-        id: q.id,
-        question: q.question,
-        answers: q.answers,
-      })),
     };
 
     try {